@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+from copy import deepcopy
+from datetime import timedelta
+from timeit import Timer
+
+CONTRACT_DATA_JSON = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), 'tests', 'data', 'test_contract_data.json'
+)
+
+with open(CONTRACT_DATA_JSON) as f:
+    contract_data = json.loads(f.read())
+
+
+def get_contract_data(announcement_date=None, years=None, days=None):
+    """
+    Contract data (same as in tests) announced and signed at
+    announcement_date, without milestones.
+    """
+    # benchmarks.imports must start with clean sys.modules
+    from openprocurement.api.utils import get_now
+    data = deepcopy(contract_data)
+    del data['milestones']
+    announcement_date = announcement_date or get_now()
+    if years is not None:
+        data['value']['contractDuration']['years'] = years
+    if days is not None:
+        data['value']['contractDuration']['days'] = days
+    data['dateSigned'] = data['noticePublicationDate'] = announcement_date.isoformat()
+    data['period']['startDate'] = announcement_date.isoformat()
+    end_date = announcement_date.replace(year=announcement_date.year + data['value']['contractDuration']['years']) + \
+        timedelta(days=data['value']['contractDuration']['days'])
+    data['period']['endDate'] = end_date.isoformat()
+    return data
+
+
+def measure(func, number=100, repeat=3):
+    """
+    Best of repeat measurements of func performance
+
+    :return: operations per second
+    :rtype: float
+    """
+    return number / min(Timer(func).repeat(repeat=repeat, number=number))
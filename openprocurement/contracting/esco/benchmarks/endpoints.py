@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end ESCO contract endpoints benchmark. It uses tests BaseWebTest
+application and database from tests.ini (i.e. local CouchDB), and measures
+latency percentiles and throughput of contract GET, contract endDate
+PATCH, milestones listing, milestone PATCH and milestone document upload
+for contracts of different durations (number of not spare milestones),
+signed some years after announcement (number of milestones) and with
+different number of documents.
+
+    python -m openprocurement.contracting.esco.benchmarks.endpoints --requests 50
+"""
+import sys
+import json
+import argparse
+from datetime import timedelta
+from itertools import product
+from timeit import default_timer
+from uuid import uuid4
+
+from iso8601 import parse_date
+
+from openprocurement.api.constants import SANDBOX_MODE
+from openprocurement.api.utils import get_now
+from openprocurement.contracting.esco.benchmarks import get_contract_data
+from openprocurement.contracting.esco.constants import DAYS_PER_YEAR
+from openprocurement.contracting.esco.tests.base import BaseContractContentWebTest
+from openprocurement.contracting.esco.utils import generate_milestones
+
+DURATIONS = (0, 7, 15)
+SIGNED_AFTER_YEARS = (0, 5)
+DOCUMENTS = (0, 100, 500)
+
+
+def percentile(values, percent):
+    """ Nearest-rank percentile of sorted values """
+    index = max(int(round(percent / 100.0 * len(values))) - 1, 0)
+    return values[index]
+
+
+def get_stats(timings):
+    timings = sorted(timings)
+    return {
+        'requests': len(timings),
+        'p50': percentile(timings, 50) * 1000,
+        'p95': percentile(timings, 95) * 1000,
+        'p99': percentile(timings, 99) * 1000,
+        'throughput': len(timings) / sum(timings),
+    }
+
+
+class EndpointsBenchmark(BaseContractContentWebTest):
+    """ Benchmark of one contract, setUp creates it with initial_data """
+
+    __test__ = False
+    initial_auth = ('Basic', ('broker', ''))
+
+    def runTest(self):  # pragma: no cover
+        pass
+
+    def add_documents(self, count):
+        """ Add documents directly to database contract """
+        doc = self.db.get(self.contract_id)
+        now = get_now().isoformat()
+        for i in xrange(count):
+            document_id = uuid4().hex
+            doc.setdefault('documents', []).append({
+                'id': document_id,
+                'title': u'document-{}.doc'.format(i),
+                'format': 'application/msword',
+                'url': 'http://localhost/contracts/{}/documents/{}'.format(self.contract_id, document_id),
+                'hash': 'md5:' + '0' * 32,
+                'documentOf': 'contract',
+                'datePublished': now,
+                'dateModified': now,
+            })
+        self.db.save(doc)
+
+    def measure(self, request, number):
+        timings = []
+        for i in xrange(number):
+            start = default_timer()
+            request(i)
+            timings.append(default_timer() - start)
+        return get_stats(timings)
+
+    def run_benchmark(self, number):
+        contract_url = '/contracts/{}'.format(self.contract_id)
+        contract = self.app.get(contract_url).json['data']
+        pending_milestone = [i for i in contract['milestones'] if i['status'] == 'pending'][0]
+        milestone_url = '{}/milestones/{}?acc_token={}'.format(
+            contract_url, pending_milestone['id'], self.contract_token)
+
+        # endDate can be changed with pending change only
+        self.app.post_json('{}/changes?acc_token={}'.format(contract_url, self.contract_token), {'data': {
+            'rationale': u'benchmark', 'rationaleTypes': ['itemPriceVariation']}})
+        end_date = min(parse_date(contract['period']['endDate']),
+                       parse_date(contract['period']['startDate']) + timedelta(days=DAYS_PER_YEAR * 15))
+        end_dates = [(end_date - timedelta(days=days)).isoformat() for days in (1, 2)]
+
+        def patch_contract(i):
+            self.app.patch_json('{}?acc_token={}'.format(contract_url, self.contract_token), {'data': {
+                'period': {'startDate': contract['period']['startDate'], 'endDate': end_dates[i % 2]}}})
+
+        def patch_milestone(i):
+            self.app.patch_json(milestone_url, {'data': {'description': u'benchmark {}'.format(i)}})
+
+        def upload_milestone_document(i):
+            response = self.app.post('{}/documents?acc_token={}'.format(contract_url, self.contract_token),
+                                     upload_files=[('file', 'benchmark.doc', 'content')])
+            self.app.patch_json('{}/documents/{}?acc_token={}'.format(
+                contract_url, response.json['data']['id'], self.contract_token), {'data': {
+                    'documentOf': 'milestone', 'relatedItem': pending_milestone['id']}})
+
+        return {
+            'contract GET': self.measure(lambda i: self.app.get(contract_url), number),
+            'contract PATCH endDate': self.measure(patch_contract, number),
+            'milestones listing': self.measure(lambda i: self.app.get(contract_url + '/milestones'), number),
+            'milestone PATCH': self.measure(patch_milestone, number),
+            'milestone document upload': self.measure(upload_milestone_document, number),
+        }
+
+
+def get_initial_data(years, signed_after_years):
+    now = get_now()
+    days = 180 if years == 0 else 0
+    data = get_contract_data(now - timedelta(days=DAYS_PER_YEAR * signed_after_years), years, days)
+    data['dateSigned'] = data['period']['startDate'] = now.isoformat()
+    data['period']['endDate'] = (now.replace(year=now.year + years) + timedelta(days=days)).isoformat()
+    if SANDBOX_MODE:
+        data['procurementMethodDetails'] = 'quick, accelerator=1440'
+    data['milestones'] = generate_milestones(data)
+    return data
+
+
+def run(number, durations=DURATIONS, signed_after_years=SIGNED_AFTER_YEARS, documents=DOCUMENTS):
+    results = []
+    EndpointsBenchmark.setUpClass()
+    try:
+        for years, after_years, documents_count in product(durations, signed_after_years, documents):
+            benchmark = EndpointsBenchmark()
+            benchmark.initial_data = get_initial_data(years, after_years)
+            benchmark.setUp()
+            try:
+                benchmark.add_documents(documents_count)
+                milestones = benchmark.app.get('/contracts/{}/milestones'.format(benchmark.contract_id))
+                results.append({
+                    'milestones': len(benchmark.initial_data['milestones']),
+                    'active_milestones': len(milestones.json['data']),
+                    'documents': documents_count,
+                    'endpoints': benchmark.run_benchmark(number),
+                })
+            finally:
+                benchmark.tearDown()
+    finally:
+        EndpointsBenchmark.tearDownClass()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ESCO contract endpoints benchmark')
+    parser.add_argument('--requests', type=int, default=50, help='requests per endpoint and contract')
+    parser.add_argument('--durations', type=int, nargs='+', default=DURATIONS,
+                        help='contract durations in years')
+    parser.add_argument('--signed-after-years', type=int, nargs='+', default=SIGNED_AFTER_YEARS,
+                        help='years between announcement and contract signing')
+    parser.add_argument('--documents', type=int, nargs='+', default=DOCUMENTS,
+                        help='number of contract documents')
+    parser.add_argument('--save', help='save results as JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args.requests, args.durations, args.signed_after_years, args.documents)
+    print('{:<26} {:>10} {:>7} {:>9} {:>9} {:>9} {:>10}'.format(
+        'endpoint', 'milestones', 'docs', 'p50 ms', 'p95 ms', 'p99 ms', 'req/sec'))
+    for result in results:
+        for name, stats in sorted(result['endpoints'].items()):
+            print('{:<26} {:>4}/{:<5} {:>7} {:>9.2f} {:>9.2f} {:>9.2f} {:>10.1f}'.format(
+                name, result['active_milestones'], result['milestones'], result['documents'],
+                stats['p50'], stats['p95'], stats['p99'], stats['throughput']))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
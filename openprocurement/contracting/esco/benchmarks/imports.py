@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Import time profile of the plugin, in the format of python -X importtime
+(which is not available on python 2). Every import statement loading new
+modules is reported with its self and cumulative time in microseconds,
+nested imports are indented:
+
+    python -m openprocurement.contracting.esco.benchmarks.imports
+    python -m openprocurement.contracting.esco.benchmarks.imports --top 20 openprocurement.contracting.esco.utils
+
+Run it in a fresh interpreter, modules imported before profiling are not
+reported.
+"""
+import sys
+import argparse
+from importlib import import_module
+from timeit import default_timer
+
+try:
+    import __builtin__ as builtins
+except ImportError:  # python 3
+    import builtins
+
+DEFAULT_MODULE = 'openprocurement.contracting.esco.includeme'
+
+
+class ImportProfiler(object):
+    """ builtins.__import__ wrapper recording imports, which load new modules """
+
+    def __init__(self):
+        self.original = builtins.__import__
+        self.records = []  # (depth, name, self time, cumulative time) in completion order
+        self.stack = []
+
+    def __call__(self, name, *args, **kwargs):
+        loaded = len(sys.modules)
+        self.stack.append(0)
+        start = default_timer()
+        try:
+            return self.original(name, *args, **kwargs)
+        finally:
+            cumulative = default_timer() - start
+            children = self.stack.pop()
+            if len(sys.modules) > loaded:
+                self.records.append((len(self.stack), name, cumulative - children, cumulative))
+                if self.stack:
+                    self.stack[-1] += cumulative
+
+    def __enter__(self):
+        builtins.__import__ = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        builtins.__import__ = self.original
+
+
+def profile(module):
+    with ImportProfiler() as profiler:
+        start = default_timer()
+        import_module(module)
+        total = default_timer() - start
+    return profiler.records, total
+
+
+def format_report(records, total, top=None):
+    lines = ['import time: self [us] | cumulative | imported package']
+    for depth, name, self_time, cumulative in records:
+        lines.append('import time: {:>9} | {:>10} | {}{}'.format(
+            int(self_time * 1e6), int(cumulative * 1e6), '  ' * depth, name))
+    if top:
+        lines.append('')
+        lines.append('slowest {} imports by self time:'.format(top))
+        for depth, name, self_time, cumulative in sorted(records, key=lambda r: -r[2])[:top]:
+            lines.append('{:>10} us  {}'.format(int(self_time * 1e6), name))
+    lines.append('')
+    lines.append('total: {} us'.format(int(total * 1e6)))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('module', nargs='?', default=DEFAULT_MODULE)
+    parser.add_argument('--top', type=int, default=10, help='slowest imports summary size')
+    args = parser.parse_args()
+    if args.module in sys.modules:
+        parser.error('{} is already imported'.format(args.module))
+    records, total = profile(args.module)
+    print(format_report(records, total, args.top))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+generate_milestones, generate_milestones_batch, accelerate_milestones and
+accelerate_periods benchmarks. Cases sweep contract durations, announcement dates around year
+boundaries, accelerators and batch sizes. Results (operations per second
+and allocations per operation) can be saved as baseline and compared with
+it later (accelerate_milestones parses and serializes periods, difference
+with accelerate_periods shows cost of ISO strings round-trips):
+
+    python -m openprocurement.contracting.esco.benchmarks.milestones --save baseline.json
+    python -m openprocurement.contracting.esco.benchmarks.milestones --compare baseline.json
+"""
+import gc
+import sys
+import json
+import argparse
+from datetime import datetime
+from itertools import product
+
+from openprocurement.contracting.esco.benchmarks import get_contract_data, measure
+from openprocurement.contracting.esco.constants import DAYS_PER_YEAR
+from iso8601 import parse_date
+
+from openprocurement.contracting.esco.utils import (
+    TZ,
+    generate_milestones,
+    generate_milestones_batch,
+    accelerate_milestones,
+    accelerate_periods,
+)
+
+try:
+    import tracemalloc
+except ImportError:  # python 2
+    tracemalloc = None
+
+DURATIONS = ((0, 180), (1, 0), (5, 100), (10, 0), (15, 0))
+ANNOUNCEMENT_DATES = (
+    ('mid-year', datetime(2018, 6, 15, 12)),
+    ('year-end', datetime(2018, 12, 31, 23, 30)),
+    ('year-start', datetime(2019, 1, 1, 0, 30)),
+)
+ACCELERATORS = (None, 1440, 86400)
+BATCH_SIZES = (1, 10, 100)
+
+
+def get_case_data(announcement_date, years, days, accelerator=None):
+    data = get_contract_data(TZ.localize(announcement_date), years, days)
+    if accelerator:
+        data['procurementMethodDetails'] = 'quick, accelerator={}'.format(accelerator)
+    return data
+
+
+def copy_contract(data):
+    # generate_milestones changes contract period and dateSigned only
+    return dict(data, period=dict(data['period']))
+
+
+def copy_milestones(milestones):
+    # accelerate_milestones changes milestones periods only
+    return [dict(i, period=dict(i['period'])) for i in milestones]
+
+
+def count_allocations(func):
+    """
+    Memory allocated by func call: peak traced memory in bytes with
+    tracemalloc, or number of new objects tracked by gc without it.
+    """
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+    gc.disable()
+    try:
+        before = len(gc.get_objects())
+        result = func()  # keep result alive while objects are counted
+        return len(gc.get_objects()) - before
+    finally:
+        gc.enable()
+
+
+def get_cases():
+    """ Benchmark cases: (name, function, operations per call) """
+    for (years, days), (date_name, date), accelerator in product(DURATIONS, ANNOUNCEMENT_DATES, ACCELERATORS):
+        data = get_case_data(date, years, days, accelerator)
+        name = '{}y{}d-{}-acc{}'.format(years, days, date_name, accelerator or 0)
+        yield ('generate_milestones:' + name,
+               lambda data=data: generate_milestones(copy_contract(data)), 1)
+        if accelerator is None:
+            milestones = generate_milestones(copy_contract(data))
+            periods = [(parse_date(m['period']['startDate']), parse_date(m['period']['endDate'])) for m in milestones]
+            statuses = [m['status'] for m in milestones]
+            for acc in ACCELERATORS[1:]:
+                yield ('accelerate_milestones:{}-acc{}'.format(name, acc),
+                       lambda milestones=milestones, acc=acc: accelerate_milestones(
+                           copy_milestones(milestones), DAYS_PER_YEAR, acc), 1)
+                yield ('accelerate_periods:{}-acc{}'.format(name, acc),
+                       lambda periods=periods, statuses=statuses, acc=acc: accelerate_periods(
+                           periods, statuses, DAYS_PER_YEAR, acc), 1)
+    for batch_size, accelerator in product(BATCH_SIZES, ACCELERATORS):
+        contracts = [
+            get_case_data(date, years, days, accelerator)
+            for (years, days), (_, date) in product(DURATIONS, ANNOUNCEMENT_DATES)
+        ]
+        contracts = (contracts * (batch_size // len(contracts) + 1))[:batch_size]
+        name = 'batch{}-acc{}'.format(batch_size, accelerator or 0)
+        yield ('generate_milestones_batch:' + name,
+               lambda contracts=contracts: generate_milestones_batch([copy_contract(i) for i in contracts]),
+               batch_size)
+        yield ('generate_milestones_loop:' + name,
+               lambda contracts=contracts: [generate_milestones(copy_contract(i)) for i in contracts],
+               batch_size)
+
+
+def run(number=20, repeat=3, pattern=None):
+    results = {}
+    for name, func, operations in get_cases():
+        if pattern and pattern not in name:
+            continue
+        results[name] = {
+            'ops_per_sec': measure(func, number=number, repeat=repeat) * operations,
+            'allocations': count_allocations(func) / float(operations),
+        }
+    return {
+        'python': sys.version.split()[0],
+        'allocations_unit': 'bytes' if tracemalloc is not None else 'objects',
+        'results': results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results with baseline
+
+    :return: names of cases which are slower than baseline more than tolerance
+    :rtype: list
+    """
+    regressions = []
+    for name in sorted(results['results']):
+        current = results['results'][name]['ops_per_sec']
+        if name not in baseline['results']:
+            print('{:<70} {:>12.1f} ops/sec (new)'.format(name, current))
+            continue
+        ratio = current / baseline['results'][name]['ops_per_sec']
+        print('{:<70} {:>12.1f} ops/sec {:>7.2f}x'.format(name, current, ratio))
+        if ratio < 1 - tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ESCO milestones generation benchmarks')
+    parser.add_argument('--number', type=int, default=20, help='calls per measurement')
+    parser.add_argument('--repeat', type=int, default=3, help='measurements per case, best is taken')
+    parser.add_argument('--filter', help='run cases with names containing this string only')
+    parser.add_argument('--save', help='save results as baseline JSON')
+    parser.add_argument('--compare', help='compare results with baseline JSON')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='relative slowdown, which is treated as regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.number, args.repeat, args.filter)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('Regressions:\n  ' + '\n  '.join(regressions))
+    else:
+        for name in sorted(results['results']):
+            result = results['results'][name]
+            print('{:<70} {:>12.1f} ops/sec {:>12.1f} {}/op'.format(
+                name, result['ops_per_sec'], result['allocations'], results['allocations_unit']))
+        regressions = []
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
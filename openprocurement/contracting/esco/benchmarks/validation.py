@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Milestone PATCH validation benchmark: baseline chain of milestone
+validators (benchmarks.baseline) against compiled validate_milestone_patch.
+
+    python -m openprocurement.contracting.esco.benchmarks.validation
+"""
+from openprocurement.contracting.esco.benchmarks import get_contract_data, measure
+from openprocurement.contracting.esco.benchmarks.baseline import milestone_patch_validators
+from openprocurement.contracting.esco.models import Contract
+from openprocurement.contracting.esco.utils import generate_milestones, get_contract_state
+from openprocurement.contracting.esco.validation import validate_milestone_patch
+
+
+class Request(object):
+    """ Minimal request for validators, which don't raise errors """
+
+    def __init__(self, context, data):
+        self.context = context
+        self.validated = {'data': data, 'contract': context.__parent__}
+
+
+def get_request():
+    data = get_contract_data()
+    data['milestones'] = generate_milestones(data)
+    contract = Contract(data)
+    milestone = contract.milestones[0]
+    milestone.__parent__ = contract
+    data = milestone.serialize('edit')
+    data['status'] = 'met'
+    data['amountPaid']['amount'] = milestone.value.amount
+    return Request(milestone, data)
+
+
+def run_validators(request):
+    for validator in milestone_patch_validators:
+        validator(request)
+
+
+def run_compiled(request):
+    get_contract_state(request, reset=True)
+    validate_milestone_patch(request)
+
+
+def main(number=10000):
+    request = get_request()
+    validators = measure(lambda: run_validators(request), number=number)
+    compiled = measure(lambda: run_compiled(request), number=number)
+    print('baseline validators:      {:>12.1f} ops/sec'.format(validators))
+    print('validate_milestone_patch: {:>12.1f} ops/sec'.format(compiled))
+    print('speedup:                  {:>12.2f}x'.format(compiled / validators))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,3 +3,14 @@ from re import compile
 
 ACCELERATOR_RE = compile(r'.accelerator=(?P<accelerator>\d+)')
 DAYS_PER_YEAR = 365
+# milestone statuses after it was fulfilled (or not)
+TERMINATED_STATUSES = ('met', 'notMet', 'partiallyMet')
+NPV_CACHE_SIZE = 1024
+NPV_CALCULATION_DURATION = 20
+PAYMENTS_CACHE_SIZE = 1024
+MILESTONES_PREVIEW_CACHE_SIZE = 256
+PROJECTIONS_CACHE_SIZE = 128
+NPV_GRID_CACHE_SIZE = 128
+NPV_GRID_MAX_SIZE = 400
+# years of precomputed localized year starts, ESCO contracts milestones span up to 16 years after announcement
+YEAR_STARTS_RANGE = (2017, 2060)
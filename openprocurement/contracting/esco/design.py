@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from couchdb.design import ViewDefinition
+from openprocurement.api import design
+
+
+def add_design():
+    for i, j in globals().items():
+        if "_view" in i:
+            setattr(design, i, j)
+
+
+# every milestone of ESCO contracts, by [dateModified, contract id, sequenceNumber]
+MILESTONES_BY_DATE_MODIFIED = '''function(doc) {
+    if(doc.doc_type == 'Contract' && doc.contractType == 'esco' && doc.milestones%s) {
+        for (var i in doc.milestones) {
+            var milestone = doc.milestones[i];
+            emit([milestone.dateModified, doc._id, milestone.sequenceNumber], {
+                id: milestone.id,
+                status: milestone.status,
+                value: milestone.value ? milestone.value.amount : null,
+                amountPaid: milestone.amountPaid ? milestone.amountPaid.amount : null
+            });
+        }
+    }
+}'''
+
+milestones_by_dateModified_view = ViewDefinition(
+    'milestones', 'by_dateModified', MILESTONES_BY_DATE_MODIFIED % '')
+
+milestones_real_by_dateModified_view = ViewDefinition(
+    'milestones', 'real_by_dateModified', MILESTONES_BY_DATE_MODIFIED % ' && !doc.mode')
+
+milestones_test_by_dateModified_view = ViewDefinition(
+    'milestones', 'test_by_dateModified', MILESTONES_BY_DATE_MODIFIED % " && doc.mode == 'test'")
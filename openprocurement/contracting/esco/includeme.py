@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 from logging import getLogger
 from pkg_resources import get_distribution
+from pyramid.events import NewResponse
 from pyramid.interfaces import IRequest
 
 from openprocurement.api.interfaces import IContentConfigurator
 from openprocurement.contracting.esco.models import IESCOContract, Contract
 from openprocurement.contracting.esco.adapters import ContractESCOConfigurator
+from openprocurement.contracting.esco import metrics
+from openprocurement.contracting.esco.design import add_design
 
 PKG = get_distribution(__package__)
 
@@ -14,8 +17,17 @@ LOGGER = getLogger(PKG.project_name)
 
 def includeme(config):
     LOGGER.info('Init contracting.esco plugin.')
+    metrics.configure(config.get_settings())
     config.add_contract_contractType(Contract)
+    add_design()
     config.scan("openprocurement.contracting.esco.views")
     config.registry.registerAdapter(ContractESCOConfigurator,
                                     (IESCOContract, IRequest),
                                     IContentConfigurator)
+    if metrics.METRICS_ENABLED:
+        LOGGER.info('Expose contracting.esco metrics.')
+        config.add_route('esco_metrics', '/esco/metrics')
+        # no ACL grants view_esco_metrics, it is available to admins (all permissions) only
+        config.add_view(metrics.metrics_view, route_name='esco_metrics', request_method='GET',
+                        permission='view_esco_metrics')
+        config.add_subscriber(metrics.observe_response_size, NewResponse)
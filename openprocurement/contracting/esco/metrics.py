@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from functools import partial, wraps
+from threading import Lock
+from timeit import default_timer
+
+from pyramid.settings import asbool
+
+process_time = getattr(time, 'process_time', None) or time.clock
+
+DEFAULT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+# request stages timings are turned on with esco.instrumentation setting
+ENABLED = False
+# hot paths counters and metrics endpoint are turned on with esco.metrics setting
+METRICS_ENABLED = False
+
+
+def configure(settings):
+    global ENABLED, METRICS_ENABLED
+    ENABLED = asbool(settings.get('esco.instrumentation', False))
+    METRICS_ENABLED = asbool(settings.get('esco.metrics', False))
+
+
+class Counter(object):
+    """ Monotonic counter """
+    type = 'counter'
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, value=1):
+        self.value += value
+
+    def dump(self):
+        return {'value': self.value}
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Histogram(object):
+    """ Cumulative histogram of observed values """
+    type = 'histogram'
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def dump(self):
+        cumulative = 0
+        buckets = OrderedDict()
+        for bucket, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            buckets[str(bucket)] = cumulative
+        return {'buckets': buckets, 'sum': self.sum, 'count': self.count}
+
+    def samples(self, name, labels):
+        for bucket, count in self.dump()['buckets'].items():
+            yield name + '_bucket', labels + (('le', bucket),), count
+        yield name + '_sum', labels, self.sum
+        yield name + '_count', labels, self.count
+
+
+class Registry(object):
+    """ In-process registry of metrics by name and labels """
+
+    def __init__(self):
+        self.metrics = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, factory, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.setdefault(key, factory())
+        return metric
+
+    def counter(self, name, **labels):
+        return self.get(Counter, name, **labels)
+
+    def histogram(self, name, buckets=DEFAULT_BUCKETS, **labels):
+        return self.get(partial(Histogram, buckets), name, **labels)
+
+    def dump(self):
+        """ Registry metrics as {name: [{'labels': ..., ...metric data}]} """
+        data = OrderedDict()
+        for (name, labels), metric in self.metrics.items():
+            data.setdefault(name, []).append(dict(metric.dump(), labels=dict(labels)))
+        return data
+
+    def dump_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.dump(), f, indent=2)
+
+    def exposition(self):
+        """ Registry metrics in Prometheus text exposition format """
+        metrics = OrderedDict()
+        for (name, labels), metric in list(self.metrics.items()):
+            metrics.setdefault(name, []).append((labels, metric))
+        lines = []
+        for name, items in metrics.items():
+            lines.append('# TYPE {} {}'.format(name, items[0][1].type))
+            for labels, metric in items:
+                for sample, sample_labels, value in metric.samples(name, labels):
+                    lines.append('{}{} {}'.format(sample, format_labels(sample_labels), repr(float(value))))
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self.lock:
+            self.metrics.clear()
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{{{}}}'.format(','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for key, value in labels
+    ))
+
+
+REGISTRY = Registry()
+
+
+def inc(name, value=1, **labels):
+    """ Increment hot path counter, if metrics are enabled """
+    if METRICS_ENABLED:
+        REGISTRY.counter(name, **labels).inc(value)
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    """ Observe hot path value, if metrics are enabled """
+    if METRICS_ENABLED:
+        REGISTRY.histogram(name, buckets, **labels).observe(value)
+
+
+class Timer(object):
+    """ Context manager measuring wall and CPU time of request stage """
+
+    def __init__(self, request, stage):
+        self.request = request
+        self.stage = stage
+
+    def __enter__(self):
+        self.wall = default_timer()
+        self.cpu = process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = default_timer() - self.wall
+        cpu = process_time() - self.cpu
+        timings = get_timings(self.request)
+        stage = timings.setdefault(self.stage, {'wall': 0, 'cpu': 0})
+        stage['wall'] += wall
+        stage['cpu'] += cpu
+        REGISTRY.histogram('esco_stage_wall_seconds', stage=self.stage).observe(wall)
+        REGISTRY.histogram('esco_stage_cpu_seconds', stage=self.stage).observe(cpu)
+
+
+class NoopTimer(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+NOOP_TIMER = NoopTimer()
+
+
+def timed(request, stage):
+    """
+    Measure request stage, if instrumentation is enabled:
+
+        with timed(request, 'save'):
+            save_contract(request)
+    """
+    return Timer(request, stage) if ENABLED else NOOP_TIMER
+
+
+def timed_validator(validator):
+    """ Validator, measured as 'validator:<name>' stage """
+    stage = 'validator:{}'.format(validator.__name__)
+
+    @wraps(validator)
+    def wrapper(request, **kwargs):
+        with timed(request, stage):
+            return validator(request, **kwargs)
+    return wrapper
+
+
+def timed_validators(*validators):
+    return tuple(timed_validator(validator) for validator in validators)
+
+
+def get_timings(request):
+    return request.environ.setdefault('esco.timings', OrderedDict())
+
+
+def timings_params(request):
+    """ Request stages timings in ms for context_unpack params """
+    return dict(
+        ('timing_{}_{}'.format(stage.replace(':', '_'), kind), '{:.3f}'.format(value * 1000))
+        for stage, timing in get_timings(request).items()
+        for kind, value in timing.items()
+    )
+
+
+def add_transition(request, source, target):
+    """ Milestone status transition of request, counted by count_transitions once contract is saved """
+    request.environ.setdefault('esco.transitions', []).append((source, target))
+
+
+def count_transitions(request):
+    for source, target in request.environ.pop('esco.transitions', ()):
+        inc('esco_milestone_status_transitions_total', source=source, target=target)
+
+
+def observe_response_size(event):
+    """ NewResponse subscriber observing serialized ESCO responses sizes """
+    request = event.request
+    route = request.matched_route
+    if route is not None and 'esco:' in route.name and event.response.content_length is not None:
+        observe('esco_response_size_bytes', event.response.content_length, SIZE_BUCKETS,
+                route=route.name, method=request.method)
+
+
+def metrics_view(request):
+    """ ESCO plugin metrics in Prometheus text format """
+    response = request.response
+    response.content_type = PROMETHEUS_CONTENT_TYPE
+    response.charset = 'utf-8'
+    response.body = REGISTRY.exposition()
+    return response
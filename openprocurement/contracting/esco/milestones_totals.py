@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Check milestones totals stored with ESCO contracts:
+
+    esco_check_milestones_totals contracts.json
+    esco_check_milestones_totals --couchdb-url http://localhost:5984 --db openprocurement --fix
+
+Contracts are read the same way as by esco_portfolio. Totals of every
+contract are recalculated from its milestones; contracts with missed or
+inconsistent totals are reported as CSV with contract id, contractID,
+stored and recalculated value and amountPaid totals. With --fix (CouchDB
+only) recalculated totals are stored with the contracts.
+"""
+import sys
+import csv
+import argparse
+
+from openprocurement.contracting.esco.models import Contract
+from openprocurement.contracting.esco.portfolio import read_dump, read_couchdb, is_selected
+from openprocurement.contracting.esco.utils import check_milestones_totals
+
+CSV_HEADER = ('id', 'contractID', 'value', 'amountPaid', 'recalculatedValue', 'recalculatedAmountPaid')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dump', nargs='?', help='contracts dump file, - for stdin')
+    parser.add_argument('--couchdb-url', help='read contracts from CouchDB server')
+    parser.add_argument('--db', help='CouchDB database name')
+    parser.add_argument('--fix', action='store_true', help='store recalculated totals, CouchDB only')
+    parser.add_argument('--output', help='CSV file, stdout by default')
+    args = parser.parse_args()
+
+    dump = db = None
+    if args.couchdb_url:
+        if not args.db:
+            parser.error('--db is required with --couchdb-url')
+        from couchdb import Server
+        db = Server(args.couchdb_url)[args.db]
+        docs = read_couchdb(args.couchdb_url, args.db)
+    elif args.dump:
+        if args.fix:
+            parser.error('--fix requires --couchdb-url')
+        dump = sys.stdin if args.dump == '-' else open(args.dump)
+        docs = read_dump(dump)
+    else:
+        parser.error('dump file or --couchdb-url is required')
+    contracts = (Contract(doc) for doc in docs if is_selected(doc))
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    writer = csv.writer(output)
+    writer.writerow(CSV_HEADER)
+    inconsistent = 0
+    try:
+        for contract, stored, recalculated in check_milestones_totals(contracts, args.fix):
+            inconsistent += 1
+            writer.writerow((
+                contract.id, contract.contractID,
+                stored.value if stored else None, stored.amountPaid if stored else None,
+                recalculated.value, recalculated.amountPaid,
+            ))
+            if args.fix:
+                contract.store(db)
+    finally:
+        if dump is not None and dump is not sys.stdin:
+            dump.close()
+        if args.output:
+            output.close()
+    sys.stderr.write('{} contracts with inconsistent milestones totals{}\n'.format(
+        inconsistent, ', fixed' if args.fix else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from uuid import uuid4
 from decimal import Decimal
+from couchdb.http import ResourceConflict
 from zope.interface import implementer
 from schematics.exceptions import ValidationError
 from schematics.transforms import whitelist, blacklist
@@ -26,7 +27,8 @@ from openprocurement.tender.esco.models import (
     ESCOValue as BaseESCOValue, to_decimal,
     view_value_role_esco as base_view_value_role_esco
 )
-from esculator import escp, npv
+from openprocurement.contracting.esco.metrics import inc
+from openprocurement.contracting.esco.utils import cached_npv, to_kopecks, from_kopecks
 
 
 contract_create_role = base_contract_create_role + \
@@ -75,7 +77,7 @@ class ESCOValue(BaseESCOValue):
     @serializable(serialized_name='amountPerformance', type=DecimalType(precision=-2))
     def amountPerformance_npv(self):
         """ Calculated energy service contract performance indicator """
-        return to_decimal(npv(
+        return to_decimal(cached_npv(
             self.contractDuration.years,
             self.contractDuration.days,
             self.yearlyPaymentsPercentage,
@@ -85,8 +87,7 @@ class ESCOValue(BaseESCOValue):
 
     @serializable(serialized_name='amount', type=DecimalType(precision=-2))
     def amount_escp(self):
-        return sum([milestone.value.amount for milestone in
-                    self.__parent__.milestones if milestone.status != 'spare'])
+        return self.__parent__.get_milestones_totals().value
 
 
 class Value(BaseValue):
@@ -97,6 +98,13 @@ class Value(BaseValue):
         }
 
 
+class MilestonesTotals(Model):
+    """ Sums of not spare milestones amounts, stored with the contract """
+
+    value = DecimalType(precision=-2)
+    amountPaid = DecimalType(precision=-2)
+
+
 class Document(BaseDocument):
     """ Contract Document """
 
@@ -113,17 +121,17 @@ class Document(BaseDocument):
             if relatedItem and isinstance(data['__parent__'], Model):
                 contract = get_contract(data['__parent__'])
                 if data.get('documentOf') == 'change' and \
-                        relatedItem not in [i.id for i in contract.changes]:
+                        relatedItem not in contract.get_items_index('changes'):
                     raise ValidationError(
                         u"relatedItem should be one of changes"
                     )
                 if data.get('documentOf') == 'item' and \
-                        relatedItem not in [i.id for i in contract.items]:
+                        relatedItem not in contract.get_items_index('items'):
                     raise ValidationError(
                         u"relatedItem should be one of items"
                     )
                 if data.get('documentOf') == 'milestone' and \
-                        relatedItem not in [i.id for i in contract.milestones]:
+                        relatedItem not in contract.get_items_index('milestones'):
                     raise ValidationError(
                         u"relatedItem should be one of milestones"
                     )
@@ -158,6 +166,22 @@ class Milestone(Model):
             'edit': whitelist('status', 'amountPaid', 'value', 'title', 'description')
         }
 
+    def get_totals_contribution(self, data=None):
+        """
+        Amounts milestone adds to contract milestones totals. If patch data is
+        passed, contribution of milestone with applied data is returned.
+
+        :param data: milestone patch data
+        :return: (value.amount, amountPaid.amount) in kopecks
+        :rtype: tuple
+        """
+        data = data or {}
+        if data.get('status', self.status) == 'spare':
+            return 0, 0
+        value = (data.get('value') or {}).get('amount', self.value.amount)
+        amount_paid = (data.get('amountPaid') or {}).get('amount', self.amountPaid.amount)
+        return to_kopecks(value), to_kopecks(amount_paid)
+
     def validate_status(self, data, status):
         if status in ['met', 'partiallyMet', 'notMet']:
             if len(data['title']) == 0:
@@ -197,6 +221,7 @@ class Contract(BaseContract):
     amountPaid = ModelType(Value)
     yearlyPaymentsPercentageRange = DecimalType(required=True)
     documents = ListType(ModelType(Document), default=list())
+    milestonesTotals = ModelType(MilestonesTotals)
 
 
     class Options:
@@ -213,8 +238,79 @@ class Contract(BaseContract):
 
     @serializable(serialized_name='amountPaid', serialize_when_none=False, type=ModelType(Value))
     def contract_amountPaid(self):
-        amount = sum([milestone.amountPaid.amount for milestone in
-                      self.milestones if milestone.status != 'spare'])
-        return Value(dict(amount=amount,
-                          currency=self.value.currency,
-                          valueAddedTaxIncluded=self.value.valueAddedTaxIncluded))
+        amount = self.get_milestones_totals().amountPaid
+        key = (amount, self.value.currency, self.value.valueAddedTaxIncluded)
+        cached = self.__dict__.get('_amount_paid')
+        if cached is None or cached[0] != key:
+            cached = (key, Value(dict(amount=amount,
+                                      currency=self.value.currency,
+                                      valueAddedTaxIncluded=self.value.valueAddedTaxIncluded)))
+            self.__dict__['_amount_paid'] = cached
+        return cached[1]
+
+    def store(self, db, *args, **kwargs):
+        # totals are derived from milestones, any write path keeps them consistent
+        self.recalculate_milestones_totals()
+        try:
+            return super(Contract, self).store(db, *args, **kwargs)
+        except ResourceConflict:
+            inc('esco_save_conflicts_total')
+            raise
+
+    def get_milestones_totals(self):
+        """
+        Sums of not spare milestones value and amountPaid amounts. Totals are
+        stored with the contract and recalculated on every store, and
+        calculated only if they are missed. Milestones changes made before
+        totals are read in the same request have to be followed by
+        update_milestones_totals or recalculate_milestones_totals.
+
+        :rtype: MilestonesTotals
+        """
+        if self.milestonesTotals is None:
+            self.recalculate_milestones_totals()
+        return self.milestonesTotals
+
+    def recalculate_milestones_totals(self):
+        value, amount_paid = 0, 0
+        for milestone in self.milestones:
+            milestone_value, milestone_amount_paid = milestone.get_totals_contribution()
+            value += milestone_value
+            amount_paid += milestone_amount_paid
+        self.milestonesTotals = MilestonesTotals({
+            'value': from_kopecks(value), 'amountPaid': from_kopecks(amount_paid)
+        })
+        return self.milestonesTotals
+
+    def update_milestones_totals(self, previous_contribution, contribution):
+        """
+        Update totals by difference of milestone contributions before and
+        after milestone change.
+
+        :param previous_contribution: milestone.get_totals_contribution() before change
+        :param contribution: milestone.get_totals_contribution() after change
+        """
+        totals = self.get_milestones_totals()
+        totals.value = from_kopecks(to_kopecks(totals.value) + contribution[0] - previous_contribution[0])
+        totals.amountPaid = from_kopecks(to_kopecks(totals.amountPaid) + contribution[1] - previous_contribution[1])
+
+    def get_items_index(self, field):
+        """
+        Index of contract list field (milestones, changes, items, documents)
+        by item id. Index is built on first use and rebuilt when the list is
+        replaced or its length is changed. For repeated ids (document
+        versions) the last item is indexed.
+
+        :param field: name of list field
+        :return: id -> item mapping
+        :rtype: dict
+        """
+        items = getattr(self, field)
+        if items is None:
+            return {}
+        indexes = self.__dict__.setdefault('_items_indexes', {})
+        cached = indexes.get(field)
+        if cached is None or cached[0] is not items or cached[1] != len(items):
+            cached = (items, len(items), dict((item.id, item) for item in items))
+            indexes[field] = cached
+        return cached[2]
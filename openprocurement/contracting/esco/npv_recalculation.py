@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Batch recalculation of ESCO contracts amountPerformance (NPV), e.g. when
+NBU discount rate is republished:
+
+    esco_recalculate_npv contracts.json --rate 0.135 --processes 4 --output npv.csv
+    esco_recalculate_npv --couchdb-url http://localhost:5984 --db openprocurement
+
+Contracts are read the same way as by esco_portfolio and grouped by
+shared NPV inputs (announcement date, contract duration and yearly
+payments percentage). Groups are calculated by a pool of worker processes:
+contract models are built in workers, discount rate days and payments
+days are calculated once per group and payments once per distinct annual
+costs reduction, the same way as by npv_grid. Results are the same as
+ESCOValue.amountPerformance_npv of each contract (with --rate, as if
+contract NBUdiscountRate was changed to it).
+
+Result is CSV with contract id, contractID, NBUdiscountRate and
+amountPerformance; throughput is reported to stderr.
+"""
+import sys
+import csv
+import argparse
+from collections import OrderedDict
+from decimal import Decimal
+from multiprocessing import Pool
+from timeit import default_timer
+
+from openprocurement.contracting.esco.models import Contract
+from openprocurement.contracting.esco.portfolio import read_dump, read_couchdb, is_selected
+from openprocurement.contracting.esco.utils import (
+    get_discount_rate_days, calculate_payments_table,
+    calculate_income, calculate_discount_rates, calculate_discounted_income,
+)
+from openprocurement.tender.esco.models import to_decimal
+
+CSV_HEADER = ('id', 'contractID', 'NBUdiscountRate', 'amountPerformance')
+
+
+def group_key(doc):
+    """ Shared NPV inputs of contract document, as stored """
+    value = doc.get('value') or {}
+    duration = value.get('contractDuration') or {}
+    return (
+        doc.get('noticePublicationDate'),
+        duration.get('years'),
+        duration.get('days'),
+        value.get('yearlyPaymentsPercentage'),
+    )
+
+
+def group_contracts(docs):
+    """
+    Group contract documents by shared NPV inputs. Documents are grouped
+    as stored, contract models are built by calculate_group.
+
+    :return: {(announcement date, years, days, yearly payments percentage):
+        [contract document, ...]}
+    :rtype: OrderedDict
+    """
+    groups = OrderedDict()
+    for doc in docs:
+        groups.setdefault(group_key(doc), []).append(doc)
+    return groups
+
+
+def calculate_group(task):
+    """
+    amountPerformance of every contract of the group (runs in worker process)
+
+    :param task: (contract documents, NBUdiscountRate or None)
+    :return: list of (contract id, contractID, NBUdiscountRate, amountPerformance)
+    """
+    docs, discount_rate = task
+    contracts = [Contract(doc) for doc in docs]
+    announcement_date = contracts[0].noticePublicationDate
+    days_for_discount_rate = get_discount_rate_days(announcement_date)
+    payments_table = calculate_payments_table(announcement_date, [(
+        contract.value.contractDuration.years,
+        contract.value.contractDuration.days,
+        contract.value.yearlyPaymentsPercentage,
+        contract.value.annualCostsReduction,
+    ) for contract in contracts])
+    rates = {}
+    amounts = {}
+    results = []
+    for contract, payments in zip(contracts, payments_table):
+        rate = contract.NBUdiscountRate if discount_rate is None else discount_rate
+        key = (tuple(contract.value.annualCostsReduction), rate)
+        if key not in amounts:
+            if rate not in rates:
+                rates[rate] = calculate_discount_rates(days_for_discount_rate, rate)
+            income = calculate_income(contract.value.annualCostsReduction, payments)
+            amounts[key] = to_decimal(sum(calculate_discounted_income(income, rates[rate])))
+        results.append((contract.id, contract.contractID, rate, amounts[key]))
+    return results
+
+
+def recalculate(groups, discount_rate=None, processes=None):
+    """
+    :param groups: result of group_contracts
+    :param discount_rate: NBUdiscountRate instead of contracts ones
+    :param processes: number of worker processes, CPU count by default,
+        groups are calculated in this process if it is 1
+    :return: generator of (contract id, contractID, NBUdiscountRate,
+        amountPerformance)
+    """
+    tasks = [(docs, discount_rate) for docs in groups.values()]
+    if processes == 1:
+        for task in tasks:
+            for result in calculate_group(task):
+                yield result
+        return
+    pool = Pool(processes)
+    try:
+        for results in pool.imap_unordered(calculate_group, tasks):
+            for result in results:
+                yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dump', nargs='?', help='contracts dump file, - for stdin')
+    parser.add_argument('--couchdb-url', help='read contracts from CouchDB server')
+    parser.add_argument('--db', help='CouchDB database name')
+    parser.add_argument('--status', default='active', help='status of contracts, active by default')
+    parser.add_argument('--rate', type=Decimal, help='NBUdiscountRate instead of contracts ones')
+    parser.add_argument('--processes', type=int, help='worker processes, CPU count by default')
+    parser.add_argument('--output', help='CSV file, stdout by default')
+    args = parser.parse_args()
+
+    def selected(docs):
+        return (doc for doc in docs if is_selected(doc) and (not args.status or doc.get('status') == args.status))
+
+    start = default_timer()
+    if args.couchdb_url:
+        if not args.db:
+            parser.error('--db is required with --couchdb-url')
+        groups = group_contracts(selected(read_couchdb(args.couchdb_url, args.db)))
+    elif args.dump:
+        dump = sys.stdin if args.dump == '-' else open(args.dump)
+        try:
+            groups = group_contracts(selected(read_dump(dump)))
+        finally:
+            if dump is not sys.stdin:
+                dump.close()
+    else:
+        parser.error('dump file or --couchdb-url is required')
+    output = open(args.output, 'w') if args.output else sys.stdout
+    writer = csv.writer(output)
+    writer.writerow(CSV_HEADER)
+    contracts = 0
+    for row in recalculate(groups, args.rate, args.processes):
+        contracts += 1
+        writer.writerow(row)
+    if args.output:
+        output.close()
+    duration = default_timer() - start
+    sys.stderr.write('{} contracts in {} groups, {:.3f} s, {:.1f} contracts/s\n'.format(
+        contracts, len(groups), duration, contracts / duration if duration else 0))
+
+
+if __name__ == '__main__':
+    main()
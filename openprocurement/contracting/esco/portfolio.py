@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Portfolio payments schedule: yearly totals of ESCO milestones value and
+amountPaid amounts by milestone status, across contracts of a procuring
+entity, of a region, or all of them.
+
+Contracts are read from a CouchDB database, or from a dump file, which is
+either _all_docs?include_docs=true response of CouchDB (one row per line)
+or JSON lines with a contract document per line ('-' is stdin):
+
+    esco_portfolio contracts.json --procuring-entity 21725150 --processes 4
+    esco_portfolio --couchdb-url http://localhost:5984 --db openprocurement --region "м. Київ"
+
+Documents are loaded into ESCO Contract models and aggregated in chunks by
+a pool of worker processes. At most a few chunks are in flight, so memory
+doesn't depend on number of contracts. Result is CSV with year, status,
+milestones count, value and amountPaid totals.
+"""
+import sys
+import csv
+import json
+import argparse
+from collections import defaultdict
+from multiprocessing import Pool, cpu_count
+
+from openprocurement.contracting.esco.models import Contract
+from openprocurement.contracting.esco.utils import to_kopecks, from_kopecks
+
+CHUNK_SIZE = 100
+# python 2 command line arguments are bytes, documents are decoded
+text_argument = lambda value: value.decode('utf-8') if isinstance(value, bytes) else value
+CSV_HEADER = ('year', 'status', 'milestones', 'value', 'amountPaid')
+
+
+def read_dump(lines):
+    """
+    Contract documents of CouchDB _all_docs?include_docs=true response or
+    of JSON lines. Documents are parsed lazily, line by line.
+    """
+    for line in lines:
+        line = line.strip().rstrip(',')
+        if not line.startswith('{'):
+            continue  # _all_docs header and footer
+        try:
+            data = json.loads(line)
+        except ValueError:
+            continue  # _all_docs header with the first row
+        yield data['doc'] if 'doc' in data and 'id' in data else data
+
+
+def read_couchdb(url, db_name, batch=CHUNK_SIZE):
+    """ Contract documents of CouchDB database, read in batches """
+    from couchdb import Server
+    db = Server(url)[db_name]
+    for row in db.iterview('_all_docs', batch, include_docs=True):
+        yield row.doc
+
+
+def is_selected(doc, procuring_entity=None, region=None):
+    if not doc or doc.get('doc_type') != 'Contract' or doc.get('contractType') != 'esco':
+        return False
+    entity = doc.get('procuringEntity') or {}
+    if procuring_entity and (entity.get('identifier') or {}).get('id') != procuring_entity:
+        return False
+    if region and (entity.get('address') or {}).get('region') != region:
+        return False
+    return True
+
+
+def chunks(docs, size=CHUNK_SIZE):
+    chunk = []
+    for doc in docs:
+        chunk.append(doc)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def aggregate_contract(contract, totals):
+    """
+    Add contract milestones to totals: (year, status) -> [milestones count,
+    value kopecks, amountPaid kopecks]
+    """
+    for milestone in contract.milestones:
+        if milestone.period is None or milestone.period.startDate is None:
+            continue
+        item = totals[(milestone.period.startDate.year, milestone.status)]
+        item[0] += 1
+        item[1] += to_kopecks(milestone.value.amount)
+        item[2] += to_kopecks(milestone.amountPaid.amount) if milestone.amountPaid else 0
+
+
+def aggregate_chunk(docs):
+    """ Totals of chunk of contract documents (runs in worker process) """
+    totals = defaultdict(lambda: [0, 0, 0])
+    for doc in docs:
+        aggregate_contract(Contract(doc), totals)
+    return len(docs), dict(totals)
+
+
+def merge(totals, chunk_totals):
+    for key, (count, value, amount_paid) in chunk_totals.items():
+        item = totals[key]
+        item[0] += count
+        item[1] += value
+        item[2] += amount_paid
+
+
+def aggregate(docs, processes=None, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Totals of contract documents, aggregated in chunks by pool of processes
+    (in this process, if processes is 1). At most 2 chunks per process are
+    in flight.
+
+    :param docs: iterable of selected contract documents
+    :param processes: number of worker processes, CPU count by default
+    :param progress: callable receiving number of aggregated contracts
+    :return: (year, status) -> [milestones count, value kopecks, amountPaid kopecks]
+    :rtype: dict
+    """
+    totals = defaultdict(lambda: [0, 0, 0])
+    contracts = 0
+    if processes == 1:
+        for chunk in chunks(docs, chunk_size):
+            count, chunk_totals = aggregate_chunk(chunk)
+            merge(totals, chunk_totals)
+            contracts += count
+            if progress:
+                progress(contracts)
+        return dict(totals)
+
+    processes = processes or cpu_count()
+    pool = Pool(processes)
+    max_in_flight = 2 * processes
+    in_flight = []
+    try:
+        for chunk in chunks(docs, chunk_size):
+            in_flight.append(pool.apply_async(aggregate_chunk, (chunk,)))
+            while len(in_flight) >= max_in_flight or (in_flight and in_flight[0].ready()):
+                count, chunk_totals = in_flight.pop(0).get()
+                merge(totals, chunk_totals)
+                contracts += count
+                if progress:
+                    progress(contracts)
+        for result in in_flight:
+            count, chunk_totals = result.get()
+            merge(totals, chunk_totals)
+            contracts += count
+            if progress:
+                progress(contracts)
+    finally:
+        pool.terminate()
+        pool.join()
+    return dict(totals)
+
+
+def write_csv(totals, output):
+    writer = csv.writer(output)
+    writer.writerow(CSV_HEADER)
+    for (year, status), (count, value, amount_paid) in sorted(totals.items()):
+        writer.writerow((year, status, count, from_kopecks(value), from_kopecks(amount_paid)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dump', nargs='?', help='contracts dump file, - for stdin')
+    parser.add_argument('--couchdb-url', help='read contracts from CouchDB server')
+    parser.add_argument('--db', help='CouchDB database name')
+    parser.add_argument('--procuring-entity', type=text_argument, help='procuringEntity.identifier.id of contracts')
+    parser.add_argument('--region', type=text_argument, help='procuringEntity.address.region of contracts')
+    parser.add_argument('--processes', type=int, help='worker processes, CPU count by default')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--output', help='CSV file, stdout by default')
+    parser.add_argument('--quiet', action='store_true', help="don't report progress to stderr")
+    args = parser.parse_args()
+
+    if args.couchdb_url:
+        if not args.db:
+            parser.error('--db is required with --couchdb-url')
+        docs = read_couchdb(args.couchdb_url, args.db)
+    elif args.dump:
+        docs = read_dump(sys.stdin if args.dump == '-' else open(args.dump))
+    else:
+        parser.error('dump file or --couchdb-url is required')
+    docs = (doc for doc in docs if is_selected(doc, args.procuring_entity, args.region))
+
+    def progress(contracts):
+        sys.stderr.write('\r{} contracts'.format(contracts))
+
+    totals = aggregate(docs, args.processes, args.chunk_size, None if args.quiet else progress)
+    if not args.quiet:
+        sys.stderr.write('\n')
+    if args.output:
+        with open(args.output, 'w') as output:
+            write_csv(totals, output)
+    else:
+        write_csv(totals, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,7 +14,21 @@ from openprocurement.contracting.api.tests.base import (
 )
 
 from openprocurement.contracting.core.tests.base import documents
-from openprocurement.contracting.esco.utils import generate_milestones
+from openprocurement.contracting.esco.utils import generate_milestones, accelerate_delta, get_accelerator
+
+
+def update_delta(delta, contract):
+    """
+    Update delta, we need this function for testing. To shrink dates.
+
+    :param delta
+    :param contract
+    :return: delta
+    :rtype: timedelta
+    """
+    if 'procurementMethodDetails' in contract:
+        return accelerate_delta(delta, get_accelerator(contract.procurementMethodDetails))
+    return delta
 
 
 # test_contract_data = deepcopy(base_test_contract_data)
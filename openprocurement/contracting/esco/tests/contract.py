@@ -15,6 +15,7 @@ from openprocurement.contracting.esco.tests.base import (
 from openprocurement.contracting.esco.tests.contract_blanks import (
     # ContractESCOTest
     simple_add_esco_contract,
+    store_recalculates_milestones_totals,
     # ContractESCOResourceTest
     create_contract,
     create_contract_generated,
@@ -32,6 +33,7 @@ from openprocurement.contracting.esco.tests.contract_blanks import (
     contract_status_change_wo_termination_details,
     contract_status_change_with_not_met,
     contract_patch_milestones_value_amount,
+    contract_npv_sensitivity,
 )
 from openprocurement.contracting.common.tests.contract_blanks import (
     # ContractESCOResourceTest
@@ -56,6 +58,7 @@ class ContractTest(BaseWebTest):
     initial_data = test_contract_data
 
     test_simple_add_contract = snitch(simple_add_esco_contract)
+    test_store_recalculates_milestones_totals = snitch(store_recalculates_milestones_totals)
 
 
 class ContractResourceTest(BaseWebTest):
@@ -103,6 +106,7 @@ class ContractResource4BrokersTestMixin(object):
     test_contract_status_change_with_not_met = snitch(contract_status_change_with_not_met)
     test_contract_patch_milestones_value_amount = snitch(contract_patch_milestones_value_amount)
     test_patch_tender_contract_period = snitch(patch_tender_contract_period)
+    test_contract_npv_sensitivity = snitch(contract_npv_sensitivity)
 
 
 class ContractResource4BrokersTest(BaseContractWebTest, ContractResource4BrokersTestMixin):
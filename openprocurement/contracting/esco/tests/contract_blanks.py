@@ -10,7 +10,7 @@ from munch import munchify
 from openprocurement.api.utils import get_now
 from openprocurement.contracting.esco.constants import DAYS_PER_YEAR
 from openprocurement.contracting.esco.models import Contract
-from openprocurement.contracting.esco.utils import update_delta
+from openprocurement.contracting.esco.tests.base import update_delta
 
 
 # ContractTest
@@ -36,6 +36,22 @@ def simple_add_esco_contract(self):
 
     u.delete_instance(self.db)
 
+
+def store_recalculates_milestones_totals(self):
+    u = Contract(self.initial_data)
+    totals = u.get_milestones_totals()
+    value, amount_paid = totals.value, totals.amountPaid
+    totals.value += 1
+    totals.amountPaid += 1
+
+    u.store(self.db)
+
+    fromdb = self.db.get(u.id)
+    self.assertEqual(Contract(fromdb).milestonesTotals.value, value)
+    self.assertEqual(Contract(fromdb).milestonesTotals.amountPaid, amount_paid)
+
+    u.delete_instance(self.db)
+
 # ContractResourceTest
 
 def esco_contract_milestones_check(self):
@@ -1025,3 +1041,38 @@ def contract_patch_milestones_value_amount(self):
     self.assertEqual(response.status, '200 OK')
     self.assertEqual(response.json['data']['status'], 'terminated')
     self.assertNotIn('terminationDetails', response.json['data'])
+
+
+def contract_npv_sensitivity(self):
+    response = self.app.get('/contracts/{}'.format(self.contract_id))
+    contract = response.json['data']
+
+    # contract values by default
+    response = self.app.get('/contracts/{}/npv_sensitivity'.format(self.contract_id))
+    self.assertEqual(response.status, '200 OK')
+    self.assertEqual(response.json['data'], [{
+        'NBUdiscountRate': contract['NBUdiscountRate'],
+        'contractDuration': {
+            'years': contract['value']['contractDuration']['years'],
+            'days': contract['value']['contractDuration'].get('days', 0),
+        },
+        'amountPerformance': contract['value']['amountPerformance'],
+    }])
+
+    response = self.app.get('/contracts/{}/npv_sensitivity'.format(self.contract_id), {
+        'NBUdiscountRate': '0.1,{}'.format(contract['NBUdiscountRate']),
+        'contractDuration': '5:0,10:180',
+    })
+    grid = response.json['data']
+    self.assertEqual(len(grid), 4)
+    self.assertEqual([(i['NBUdiscountRate'], i['contractDuration']['years']) for i in grid],
+                     [(0.1, 5), (0.1, 10), (contract['NBUdiscountRate'], 5), (contract['NBUdiscountRate'], 10)])
+    # higher discount rate, lower performance
+    self.assertGreater(grid[0]['amountPerformance'], grid[2]['amountPerformance'])
+
+    response = self.app.get('/contracts/{}/npv_sensitivity'.format(self.contract_id),
+                            {'NBUdiscountRate': '1.5'}, status=422)
+    self.assertEqual(response.json['errors'][0]['name'], 'NBUdiscountRate')
+    response = self.app.get('/contracts/{}/npv_sensitivity'.format(self.contract_id),
+                            {'contractDuration': '16:0'}, status=422)
+    self.assertEqual(response.json['errors'][0]['name'], 'contractDuration')
@@ -5,7 +5,12 @@ from openprocurement.contracting.esco.tests import (
     contract,
     change,
     document,
+    metrics,
     milestone,
+    npv_recalculation,
+    portfolio,
+    utils,
+    validation,
 )
 
 
@@ -14,7 +19,12 @@ def suite():
     suite.addTest(contract.suite())
     suite.addTest(change.suite())
     suite.addTest(document.suite())
+    suite.addTest(metrics.suite())
     suite.addTest(milestone.suite())
+    suite.addTest(npv_recalculation.suite())
+    suite.addTest(portfolio.suite())
+    suite.addTest(utils.suite())
+    suite.addTest(validation.suite())
     return suite
 
 
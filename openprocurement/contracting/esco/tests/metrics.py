@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from mock import MagicMock, patch
+
+from openprocurement.contracting.esco import metrics
+from openprocurement.contracting.esco.metrics import (
+    Histogram, Registry, REGISTRY, timed, timed_validators, get_timings, timings_params, inc, observe,
+    add_transition, count_transitions,
+)
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_observe(self):
+        histogram = Histogram(buckets=(1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+        data = histogram.dump()
+        self.assertEqual(list(data['buckets'].items()), [('1', 2), ('5', 3), ('+Inf', 4)])
+        self.assertEqual((data['sum'], data['count']), (14.5, 4))
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_get_by_labels(self):
+        registry = Registry()
+        histogram = registry.histogram('stage', stage='save')
+        self.assertIs(registry.histogram('stage', stage='save'), histogram)
+        self.assertIsNot(registry.histogram('stage', stage='factory'), histogram)
+        histogram.observe(0.1)
+        data = registry.dump()
+        self.assertEqual([i['labels'] for i in data['stage']], [{'stage': 'save'}, {'stage': 'factory'}])
+        self.assertEqual(data['stage'][0]['count'], 1)
+
+
+class TestExposition(unittest.TestCase):
+
+    def setUp(self):
+        REGISTRY.clear()
+
+    def test_disabled(self):
+        inc('esco_npv_computations_total', cache='hit')
+        observe('esco_npv_seconds', 0.1)
+        self.assertEqual(REGISTRY.exposition(), '\n')
+
+    @patch.object(metrics, 'METRICS_ENABLED', True)
+    def test_exposition(self):
+        inc('esco_npv_computations_total', cache='hit')
+        inc('esco_npv_computations_total', cache='hit')
+        observe('esco_response_size_bytes', 3000, buckets=(1024, 4096), route='milestone "get"')
+        self.assertEqual(REGISTRY.exposition().splitlines(), [
+            '# TYPE esco_npv_computations_total counter',
+            'esco_npv_computations_total{cache="hit"} 2.0',
+            '# TYPE esco_response_size_bytes histogram',
+            'esco_response_size_bytes_bucket{route="milestone \\"get\\"",le="1024"} 0.0',
+            'esco_response_size_bytes_bucket{route="milestone \\"get\\"",le="4096"} 1.0',
+            'esco_response_size_bytes_bucket{route="milestone \\"get\\"",le="+Inf"} 1.0',
+            'esco_response_size_bytes_sum{route="milestone \\"get\\""} 3000.0',
+            'esco_response_size_bytes_count{route="milestone \\"get\\""} 1.0',
+        ])
+
+
+class TestTransitions(unittest.TestCase):
+
+    def setUp(self):
+        REGISTRY.clear()
+
+    @patch.object(metrics, 'METRICS_ENABLED', True)
+    def test_counted_once_saved(self):
+        request = MagicMock(environ={})
+        add_transition(request, 'pending', 'met')
+        add_transition(request, 'scheduled', 'pending')
+        self.assertEqual(REGISTRY.dump(), {})
+        count_transitions(request)
+        count_transitions(request)
+        data = REGISTRY.dump()['esco_milestone_status_transitions_total']
+        self.assertEqual([(i['labels'], i['value']) for i in data], [
+            ({'source': 'pending', 'target': 'met'}, 1),
+            ({'source': 'scheduled', 'target': 'pending'}, 1),
+        ])
+
+
+class TestTimed(unittest.TestCase):
+
+    def setUp(self):
+        self.request = MagicMock(environ={})
+        REGISTRY.clear()
+
+    def test_disabled(self):
+        with timed(self.request, 'save'):
+            pass
+        self.assertEqual(self.request.environ, {})
+        self.assertEqual(timings_params(self.request), {})
+
+    @patch.object(metrics, 'ENABLED', True)
+    def test_enabled(self):
+        def validate_data(request, **kwargs):
+            request.validated = 'data'
+
+        validator, = timed_validators(validate_data)
+        self.assertEqual(validator.__name__, 'validate_data')
+        validator(self.request)
+        for _ in range(2):
+            with timed(self.request, 'save'):
+                pass
+        self.assertEqual(self.request.validated, 'data')
+        self.assertEqual(list(get_timings(self.request)), ['validator:validate_data', 'save'])
+        self.assertEqual(REGISTRY.histogram('esco_stage_wall_seconds', stage='save').count, 2)
+        self.assertEqual(sorted(timings_params(self.request)), [
+            'timing_save_cpu', 'timing_save_wall',
+            'timing_validator_validate_data_cpu', 'timing_validator_validate_data_wall',
+        ])
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestHistogram))
+    suite.addTest(unittest.makeSuite(TestRegistry))
+    suite.addTest(unittest.makeSuite(TestExposition))
+    suite.addTest(unittest.makeSuite(TestTransitions))
+    suite.addTest(unittest.makeSuite(TestTimed))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
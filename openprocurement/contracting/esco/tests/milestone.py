@@ -18,6 +18,13 @@ from openprocurement.contracting.esco.tests.milestone_blanks import (
     met_status_update,
     notMet_status_update,
     partiallyMet_status_update,
+    patch_milestones_bulk,
+    milestones_preview,
+    milestones_feed,
+    milestones_feed_mode,
+    milestones_projection,
+    milestones_etag,
+    milestone_patch_revision,
 )
 
 
@@ -33,6 +40,13 @@ class ContractMilestoneResourceMixin(object):
     test_patch_milestone = snitch(patch_milestone)
     test_patch_milestone_description = snitch(patch_milestone_description)
     test_patch_milestone_title = snitch(patch_milestone_title)
+    test_patch_milestones_bulk = snitch(patch_milestones_bulk)
+    test_milestones_preview = snitch(milestones_preview)
+    test_milestones_feed = snitch(milestones_feed)
+    test_milestones_feed_mode = snitch(milestones_feed_mode)
+    test_milestones_projection = snitch(milestones_projection)
+    test_milestones_etag = snitch(milestones_etag)
+    test_milestone_patch_revision = snitch(milestone_patch_revision)
 
 
 class ContractMilestoneResourceTest(BaseContractWebTest, ContractMilestoneResourceMixin):
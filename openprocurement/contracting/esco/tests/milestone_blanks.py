@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
+from copy import deepcopy
 from datetime import timedelta
+from uuid import uuid4
 
+from iso8601 import parse_date
+from mock import patch
 from munch import munchify
 
 from openprocurement.api.utils import get_now
-from openprocurement.contracting.esco.utils import update_delta
+from openprocurement.contracting.esco.tests.base import update_delta
 
 
 def listing_milestones(self):
@@ -1442,3 +1446,278 @@ def patch_milestone(self):
     self.assertEqual(response.status, '200 OK')
     self.assertEqual(response.content_type, 'application/json')
     self.assertGreater(response.json['data']['value']['amount'], self.initial_data['value']['amount'])
+
+
+def patch_milestones_bulk(self):
+    response = self.app.get('/contracts/{}/milestones'.format(self.contract_id))
+    milestones = response.json['data']
+    self.assertEqual(milestones[0]['status'], 'pending')
+    self.assertEqual(milestones[1]['status'], 'scheduled')
+
+    # not existing milestone
+    response = self.app.patch_json('/contracts/{}/milestones?acc_token={}'.format(
+        self.contract_id, self.contract_token), {'data': [{'id': 'invalid_id', 'status': 'met'}]}, status=422)
+    self.assertEqual(response.json['errors'], [
+        {"location": "body", "name": "data", "description": "Milestone invalid_id not found"}])
+
+    # data should be a list
+    response = self.app.patch_json('/contracts/{}/milestones?acc_token={}'.format(
+        self.contract_id, self.contract_token), {'data': {'id': milestones[0]['id']}}, status=422)
+    self.assertEqual(response.json['errors'], [
+        {"location": "body", "name": "data", "description": "Data not available"}])
+
+    # time travel to second milestone period
+    with patch('openprocurement.contracting.esco.validation.get_now') as mocked_get_now:
+        mocked_get_now.return_value = get_now().replace(year=get_now().year + 1) + timedelta(days=1)
+
+        # scheduled milestone can't be updated, so no milestone is updated
+        response = self.app.patch_json('/contracts/{}/milestones?acc_token={}'.format(
+            self.contract_id, self.contract_token), {'data': [
+                {'id': milestones[0]['id'], 'status': 'met', 'amountPaid': {'amount': milestones[0]['value']['amount']}},
+                {'id': milestones[2]['id'], 'status': 'met', 'amountPaid': {'amount': milestones[2]['value']['amount']}},
+            ]}, status=403)
+        self.assertEqual(response.json['errors'], [
+            {"location": "body", "name": "data",
+             "description": "Can't update milestone in scheduled status without pending change"}])
+        response = self.app.get('/contracts/{}/milestones'.format(self.contract_id))
+        self.assertEqual(response.json['data'], milestones)
+
+        # second milestone becomes pending after first one is met
+        response = self.app.patch_json('/contracts/{}/milestones?acc_token={}'.format(
+            self.contract_id, self.contract_token), {'data': [
+                {'id': milestones[1]['id'], 'status': 'partiallyMet', 'amountPaid': {'amount': 1}},
+                {'id': milestones[0]['id'], 'status': 'met', 'amountPaid': {'amount': milestones[0]['value']['amount']}},
+            ]})
+    self.assertEqual(response.status, '200 OK')
+    self.assertEqual([(i['id'], i['status']) for i in response.json['data']],
+                     [(milestones[0]['id'], 'met'), (milestones[1]['id'], 'partiallyMet')])
+
+    response = self.app.get('/contracts/{}'.format(self.contract_id))
+    contract = response.json['data']
+    self.assertEqual(contract['milestones'][2]['status'], 'pending')
+    self.assertAlmostEqual(contract['amountPaid']['amount'], milestones[0]['value']['amount'] + 1, places=2)
+
+
+def milestones_preview(self):
+    response = self.app.get('/contracts/{}/milestones_preview'.format(self.contract_id), status=422)
+    self.assertEqual(response.json['errors'], [
+        {"location": "querystring", "name": "endDate", "description": "This field is required."}])
+    response = self.app.get('/contracts/{}/milestones_preview?endDate=invalid'.format(self.contract_id), status=422)
+    self.assertEqual(response.json['errors'][0]['name'], 'endDate')
+
+    response = self.app.get('/contracts/{}'.format(self.contract_id))
+    contract = response.json['data']
+    delta = update_delta(timedelta(days=365), munchify(self.initial_data))
+    end_date = (parse_date(contract['period']['endDate']) + delta).isoformat()
+    response = self.app.get('/contracts/{}/milestones_preview'.format(self.contract_id), {'endDate': end_date})
+    self.assertEqual(response.status, '200 OK')
+    preview = response.json['data']
+    self.assertEqual(len(preview), len(self.initial_data['milestones']))
+    self.assertEqual(len([m for m in preview if m['status'] != 'spare']), len(contract['milestones']) + 1)
+    # contract isn't changed
+    response = self.app.get('/contracts/{}'.format(self.contract_id))
+    self.assertEqual(response.json['data'], contract)
+    # cached preview
+    response = self.app.get('/contracts/{}/milestones_preview'.format(self.contract_id), {'endDate': end_date})
+    self.assertEqual(response.json['data'], preview)
+
+    # preview is the same as contract endDate change
+    response = self.app.post_json('/contracts/{}/changes?acc_token={}'.format(
+        self.contract_id, self.contract_token), {'data': {
+            'rationale': u'причина зміни укр',
+            'rationale_en': 'change cause en',
+            'rationaleTypes': ['itemPriceVariation']}})
+    self.assertEqual(response.status, '201 Created')
+    contract['period']['endDate'] = end_date
+    response = self.app.patch_json('/contracts/{}?acc_token={}'.format(
+        self.contract_id, self.contract_token), {'data': {'period': contract['period']}})
+    self.assertEqual(response.status, '200 OK')
+    self.assertEqual(
+        [(m['id'], m['status'], m['period']) for m in response.json['data']['milestones']],
+        [(m['id'], m['status'], m['period']) for m in preview if m['status'] != 'spare'])
+
+    # too long contract period
+    end_date = (parse_date(contract['period']['startDate']) + update_delta(
+        timedelta(days=365 * 15 + 1), munchify(self.initial_data))).isoformat()
+    response = self.app.get('/contracts/{}/milestones_preview'.format(self.contract_id), {'endDate': end_date},
+                            status=403)
+    self.assertEqual(response.json['errors'][0]['description'], "Contract period cannot be over 15 years")
+
+
+def milestones_feed(self):
+    response = self.app.get('/esco/milestones')
+    self.assertEqual(response.status, '200 OK')
+    feed = response.json['data']
+    milestones = [m for m in feed if m['contract_id'] == self.contract_id]
+    self.assertEqual(len(milestones), len(self.initial_data['milestones']))
+    self.assertEqual(set(milestones[0]), {
+        'id', 'contract_id', 'sequenceNumber', 'status', 'dateModified', 'value', 'amountPaid'})
+    self.assertEqual(sorted(m['dateModified'] for m in feed), [m['dateModified'] for m in feed])
+
+    # paging
+    response = self.app.get('/esco/milestones', {'limit': 2})
+    self.assertEqual(response.json['data'], feed[:2])
+    response = self.app.get(response.json['next_page']['path'])
+    self.assertEqual(response.json['data'], feed[2:4])
+
+    # changed milestone is at the end of feed
+    offset = response.json['next_page']['offset']
+    response = self.app.get('/esco/milestones', {'offset': feed[-1]['dateModified']})
+    self.assertEqual(response.json['data'][-1], feed[-1])
+    next_page = response.json['next_page']['path']
+    response = self.app.get(next_page)
+    self.assertEqual(response.json['data'], [])
+
+    pending = [m for m in milestones if m['status'] == 'pending'][0]
+    index = feed.index(pending)
+    # page ending with pending milestone
+    pending_offset = '|'.join([pending['dateModified'], pending['contract_id'], str(pending['sequenceNumber'])])
+    response = self.app.patch_json('/contracts/{}/milestones/{}?acc_token={}'.format(
+        self.contract_id, pending['id'], self.contract_token), {'data': {'title': 'Changed title'}})
+    self.assertEqual(response.status, '200 OK')
+    # last milestone of the page has moved, but the next one is not lost
+    response = self.app.get('/esco/milestones', {'offset': pending_offset, 'limit': 1})
+    self.assertEqual(response.json['data'], feed[index + 1:index + 2])
+    response = self.app.get(next_page)
+    self.assertEqual([(m['id'], m['dateModified']) for m in response.json['data']],
+                     [(pending['id'], response.json['data'][0]['dateModified'])])
+    self.assertGreater(response.json['data'][0]['dateModified'], pending['dateModified'])
+    self.assertNotEqual(offset, response.json['next_page']['offset'])
+
+
+def milestones_feed_mode(self):
+    data = deepcopy(self.initial_data)
+    data.update({'id': uuid4().hex, 'mode': u'test'})
+    orig_auth = self.app.authorization
+    self.app.authorization = ('Basic', ('contracting', ''))
+    response = self.app.post_json('/contracts', {'data': data})
+    self.app.authorization = orig_auth
+    test_contract_id = response.json['data']['id']
+
+    def contracts(mode=None):
+        params = {'limit': 1000}
+        if mode:
+            params['mode'] = mode
+        response = self.app.get('/esco/milestones', params)
+        if mode:
+            self.assertIn('mode={}'.format(mode), response.json['next_page']['path'])
+        return set(m['contract_id'] for m in response.json['data'])
+
+    self.assertIn(self.contract_id, contracts())
+    self.assertNotIn(test_contract_id, contracts())
+    self.assertIn(test_contract_id, contracts('test'))
+    self.assertNotIn(self.contract_id, contracts('test'))
+    self.assertTrue({self.contract_id, test_contract_id} <= contracts('_all_'))
+    del self.db[test_contract_id]
+
+
+def milestones_projection(self):
+    response = self.app.get('/contracts/{}/milestones?opt_fields=status,amountPaid'.format(self.contract_id))
+    self.assertEqual(response.status, '200 OK')
+    for milestone in response.json['data']:
+        self.assertEqual(set(milestone), {'id', 'status', 'amountPaid'})
+    pending = response.json['data'][0]
+
+    response = self.app.get('/contracts/{}/milestones/{}?opt_fields=status'.format(self.contract_id, pending['id']))
+    self.assertEqual(response.json['data'], {'id': pending['id'], 'status': 'pending'})
+
+    response = self.app.get('/contracts/{}?opt_fields=status,amountPaid'.format(self.contract_id))
+    self.assertEqual(set(response.json['data']), {'id', 'status', 'amountPaid'})
+
+    # minimal response of update
+    response = self.app.patch_json(
+        '/contracts/{}/milestones/{}?acc_token={}'.format(self.contract_id, pending['id'], self.contract_token),
+        {'data': {'title': 'Changed title'}}, headers={'Prefer': 'return=minimal'})
+    self.assertEqual(response.status, '200 OK')
+    self.assertEqual(response.headers['Preference-Applied'], 'return=minimal')
+    self.assertEqual(set(response.json['data']), {'id', 'dateModified'})
+    self.assertEqual(response.json['data']['id'], pending['id'])
+
+    response = self.app.patch_json(
+        '/contracts/{}/milestones/{}?acc_token={}&opt_fields=title'.format(
+            self.contract_id, pending['id'], self.contract_token),
+        {'data': {'title': 'Changed title again'}})
+    self.assertEqual(response.json['data'], {'id': pending['id'], 'title': 'Changed title again'})
+
+
+def milestones_etag(self):
+    response = self.app.get('/contracts/{}/milestones'.format(self.contract_id))
+    etag = response.headers['ETag']
+    milestone = response.json['data'][0]
+    response = self.app.get('/contracts/{}/milestones'.format(self.contract_id),
+                            headers={'If-None-Match': etag}, status=304)
+    self.assertEqual(response.body, '')
+    self.assertEqual(response.headers['ETag'], etag)
+    # projection is another representation
+    response = self.app.get('/contracts/{}/milestones?opt_fields=status'.format(self.contract_id),
+                            headers={'If-None-Match': etag})
+    self.assertEqual(response.status, '200 OK')
+    self.assertNotEqual(response.headers['ETag'], etag)
+
+    response = self.app.get('/contracts/{}/milestones/{}'.format(self.contract_id, milestone['id']))
+    milestone_etag = response.headers['ETag']
+    self.app.get('/contracts/{}/milestones/{}'.format(self.contract_id, milestone['id']),
+                 headers={'If-None-Match': milestone_etag}, status=304)
+
+    # optimistic concurrency
+    response = self.app.patch_json(
+        '/contracts/{}/milestones/{}?acc_token={}'.format(self.contract_id, milestone['id'], self.contract_token),
+        {'data': {'title': 'Changed title'}}, headers={'If-Match': milestone_etag})
+    self.assertEqual(response.status, '200 OK')
+    self.assertNotEqual(response.headers['ETag'], milestone_etag)
+    new_etag = response.headers['ETag']
+
+    response = self.app.patch_json(
+        '/contracts/{}/milestones/{}?acc_token={}'.format(self.contract_id, milestone['id'], self.contract_token),
+        {'data': {'title': 'Lost update'}}, headers={'If-Match': milestone_etag}, status=412)
+    self.assertEqual(response.json['errors'], [
+        {"location": "header", "name": "If-Match", "description": "Precondition Failed"}])
+    response = self.app.patch_json(
+        '/contracts/{}/milestones?acc_token={}'.format(self.contract_id, self.contract_token),
+        {'data': [{'id': milestone['id'], 'title': 'Lost update'}]}, headers={'If-Match': etag}, status=412)
+
+    # changed milestone is read again
+    response = self.app.get('/contracts/{}/milestones/{}'.format(self.contract_id, milestone['id']),
+                            headers={'If-None-Match': milestone_etag})
+    self.assertEqual(response.status, '200 OK')
+    self.assertEqual(response.json['data']['title'], 'Changed title')
+    self.assertEqual(response.headers['ETag'], new_etag)
+
+    # If-Match compares versions, projection of response doesn't matter
+    response = self.app.patch_json(
+        '/contracts/{}/milestones/{}?acc_token={}&opt_fields=title'.format(
+            self.contract_id, milestone['id'], self.contract_token),
+        {'data': {'title': 'Changed again'}}, headers={'If-Match': new_etag})
+    self.assertEqual(response.status, '200 OK')
+    self.assertEqual(set(response.json['data']), {'id', 'title'})
+    projection_etag = response.headers['ETag']
+    response = self.app.patch_json(
+        '/contracts/{}/milestones/{}?acc_token={}'.format(self.contract_id, milestone['id'], self.contract_token),
+        {'data': {'title': 'Changed title'}}, headers={'If-Match': projection_etag})
+    self.assertEqual(response.status, '200 OK')
+
+
+def milestone_patch_revision(self):
+    response = self.app.get('/contracts/{}/milestones'.format(self.contract_id))
+    milestones = response.json['data']
+    pending = milestones[0]
+    self.assertEqual(pending['status'], 'pending')
+    revisions = len(self.db.get(self.contract_id)['revisions'])
+
+    response = self.app.patch_json('/contracts/{}/milestones/{}?acc_token={}'.format(
+        self.contract_id, pending['id'], self.contract_token), {'data': {'title': 'Changed title'}})
+    self.assertEqual(response.status, '200 OK')
+    doc = self.db.get(self.contract_id)
+    self.assertEqual(len(doc['revisions']), revisions + 1)
+    changes = doc['revisions'][-1]['changes']
+    self.assertIn({'op': 'replace', 'path': '/milestones/0/title', 'value': pending['title']}, changes)
+    # not touched milestones aren't in revision
+    self.assertFalse([i for i in changes if i['path'].startswith('/milestones/') and
+                      not i['path'].startswith('/milestones/0/')])
+
+    response = self.app.patch_json('/contracts/{}/milestones?acc_token={}'.format(
+        self.contract_id, self.contract_token), {'data': [{'id': pending['id'], 'description': 'Changed'}]})
+    self.assertEqual(response.status, '200 OK')
+    doc = self.db.get(self.contract_id)
+    self.assertEqual(len(doc['revisions']), revisions + 2)
+    self.assertIn('/milestones/0/description', [i['path'] for i in doc['revisions'][-1]['changes']])
@@ -5,7 +5,7 @@ from datetime import timedelta
 from mock import patch, MagicMock
 
 from openprocurement.api.utils import get_now
-from openprocurement.contracting.esco.models import Milestone
+from openprocurement.contracting.esco.models import Milestone, Contract
 
 
 class TestMilestone(unittest.TestCase):
@@ -29,9 +29,57 @@ class TestMilestone(unittest.TestCase):
         milestone.validate()
 
 
+class TestContract(unittest.TestCase):
+    milestone_data = {
+        "sequenceNumber": 1,
+        "value": {'amount': 1000, 'currency': 'UAH', 'valueAddedTaxIncluded': True},
+        "amountPaid": {'amount': 0, 'currency': 'UAH', 'valueAddedTaxIncluded': True},
+        "status": "scheduled"
+    }
+
+    def test_get_items_index(self):
+        milestone_data = self.milestone_data
+        contract = Contract({'milestones': [milestone_data]})
+        milestone = contract.milestones[0]
+        index = contract.get_items_index('milestones')
+        self.assertIs(index[milestone.id], milestone)
+        self.assertIs(contract.get_items_index('milestones'), index)
+
+        # index is rebuilt after list change
+        contract.milestones.append(Milestone(dict(milestone_data, sequenceNumber=2)))
+        index = contract.get_items_index('milestones')
+        self.assertEqual(len(index), 2)
+        self.assertIs(index[contract.milestones[1].id], contract.milestones[1])
+
+        contract.milestones = []
+        self.assertEqual(contract.get_items_index('milestones'), {})
+
+    def test_milestones_totals(self):
+        contract = Contract({'milestones': [
+            dict(self.milestone_data, sequenceNumber=1, status='pending'),
+            dict(self.milestone_data, sequenceNumber=2),
+            dict(self.milestone_data, sequenceNumber=3, status='spare'),
+        ]})
+        self.assertIsNone(contract.milestonesTotals)
+        totals = contract.get_milestones_totals()
+        self.assertEqual((totals.value, totals.amountPaid), (2000, 0))
+
+        milestone = contract.milestones[0]
+        data = {'status': 'met', 'amountPaid': {'amount': 1000}}
+        contract.update_milestones_totals(milestone.get_totals_contribution(),
+                                          milestone.get_totals_contribution(data))
+        self.assertEqual((totals.value, totals.amountPaid), (2000, 1000))
+
+        milestone = contract.milestones[2]
+        contract.update_milestones_totals(milestone.get_totals_contribution(),
+                                          milestone.get_totals_contribution({'status': 'scheduled'}))
+        self.assertEqual((totals.value, totals.amountPaid), (3000, 1000))
+
+
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(TestMilestone))
+    suite.addTest(unittest.makeSuite(TestContract))
     return suite
 
 
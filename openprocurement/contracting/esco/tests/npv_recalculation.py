@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import unittest
+from copy import deepcopy
+from decimal import Decimal
+
+from openprocurement.contracting.esco.models import Contract
+from openprocurement.contracting.esco.npv_recalculation import group_contracts, calculate_group, recalculate
+from openprocurement.contracting.esco.tests.base import test_contract_data
+
+
+class TestNPVRecalculation(unittest.TestCase):
+
+    def setUp(self):
+        self.docs = []
+        for i in range(4):
+            doc = deepcopy(test_contract_data)
+            doc.update({'_id': str(i) * 32, 'doc_type': 'Contract', 'contractType': 'esco'})
+            self.docs.append(doc)
+        self.docs[3]['value']['annualCostsReduction'] = [i + 1 for i in self.docs[3]['value']['annualCostsReduction']]
+
+    def test_group_contracts(self):
+        groups = group_contracts(self.docs)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups.values()[0], self.docs)
+
+    def test_calculate_group(self):
+        results = calculate_group((self.docs, None))
+        self.assertEqual([result[0] for result in results], [doc['_id'] for doc in self.docs])
+        for doc, (_, contract_id, rate, amount) in zip(self.docs, results):
+            contract = Contract(doc)
+            self.assertEqual(contract_id, contract.contractID)
+            self.assertEqual(rate, contract.NBUdiscountRate)
+            self.assertEqual(amount, contract.value.amountPerformance_npv)
+        self.assertNotEqual(results[3][3], results[0][3])
+
+    def test_recalculate(self):
+        groups = group_contracts(self.docs)
+        results = sorted(recalculate(groups, processes=1))
+        self.assertEqual(sorted(recalculate(groups, processes=2)), results)
+        self.assertEqual(len(results), len(self.docs))
+
+    def test_recalculate_rate(self):
+        rate = Decimal('0.2')
+        results = list(recalculate(group_contracts(self.docs), rate, processes=1))
+        doc = dict(self.docs[0], NBUdiscountRate=0.2)
+        self.assertEqual(results[0][2], rate)
+        self.assertEqual(results[0][3], Contract(doc).value.amountPerformance_npv)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestNPVRecalculation))
+    return suite
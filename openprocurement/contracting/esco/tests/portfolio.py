@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+from copy import deepcopy
+from decimal import Decimal
+from StringIO import StringIO
+
+from openprocurement.contracting.esco.models import Contract
+from openprocurement.contracting.esco.portfolio import read_dump, is_selected, aggregate, write_csv
+from openprocurement.contracting.esco.tests.base import test_contract_data
+from openprocurement.contracting.esco.utils import to_kopecks
+
+
+class TestPortfolio(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = deepcopy(test_contract_data)
+        self.doc.update({'_id': 'a' * 32, 'doc_type': 'Contract', 'contractType': 'esco'})
+
+    def test_read_dump(self):
+        all_docs = '{"total_rows":2,"offset":0,"rows":[\r\n' + ',\r\n'.join(
+            json.dumps({'id': i, 'key': i, 'value': {}, 'doc': dict(self.doc, _id=i)}) for i in ('1', '2')
+        ) + '\r\n]}\n'
+        self.assertEqual([d['_id'] for d in read_dump(StringIO(all_docs))], ['1', '2'])
+        lines = '\n'.join(json.dumps(dict(self.doc, _id=i)) for i in ('1', '2'))
+        self.assertEqual([d['_id'] for d in read_dump(StringIO(lines))], ['1', '2'])
+
+    def test_is_selected(self):
+        identifier = self.doc['procuringEntity']['identifier']['id']
+        self.assertTrue(is_selected(self.doc, procuring_entity=identifier))
+        self.assertFalse(is_selected(self.doc, procuring_entity=identifier + '0'))
+        self.assertFalse(is_selected(dict(self.doc, contractType='common')))
+        self.assertFalse(is_selected(None))
+
+    def test_aggregate(self):
+        docs = [dict(self.doc, _id=str(i)) for i in range(5)]
+        totals = aggregate(iter(docs), processes=1, chunk_size=2)
+        self.assertEqual(aggregate(iter(docs), processes=2, chunk_size=2), totals)
+
+        milestones = Contract(self.doc).milestones
+        self.assertEqual(sum(i[0] for i in totals.values()), 5 * len(milestones))
+        self.assertEqual(sum(i[1] for i in totals.values()),
+                         5 * sum(to_kopecks(m.value.amount) for m in milestones))
+        first = milestones[0]
+        self.assertEqual(totals[(first.period.startDate.year, first.status)][0], 5)
+
+        output = StringIO()
+        write_csv(totals, output)
+        rows = output.getvalue().splitlines()
+        self.assertEqual(rows[0], 'year,status,milestones,value,amountPaid')
+        self.assertEqual(len(rows), len(totals) + 1)
+        self.assertEqual(sum(Decimal(row.split(',')[3]) for row in rows[1:]),
+                         5 * sum(m.value.amount for m in milestones))
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestPortfolio))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
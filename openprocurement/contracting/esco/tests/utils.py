@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+import unittest
+from copy import deepcopy
+from decimal import Decimal
+from fractions import Fraction
+from operator import attrgetter
+from datetime import datetime, timedelta
+
+from esculator.calculations import discount_rate_days, payments_days, calculate_payments
+from iso8601 import parse_date
+from mock import patch, MagicMock
+
+from openprocurement.contracting.esco.constants import DAYS_PER_YEAR
+from openprocurement.contracting.esco.models import Milestone, Contract
+from openprocurement.contracting.esco.tests.base import test_contract_data
+from openprocurement.contracting.esco.utils import (
+    LRUCache, NPV_CACHE, cached_npv, serialize_items,
+    generate_milestones, generate_milestones_batch, check_milestones_totals, accelerate_milestones,
+    ContractSnapshot, ContractState, calculate_payments_table, TZ, YEAR_STARTS, localized_year_start,
+    DISCOUNT_RATE_DAYS_CACHE, PAYMENTS_CACHE, NPV_GRID_CACHE, npv_grid, serialize_projection, to_decimal, to_kopecks, from_kopecks, fraction_to_kopecks,
+)
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_get_put(self):
+        cache = LRUCache(2)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')  # 'b' is least recently used now
+        cache.put('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIn('a', cache)
+        self.assertIn('c', cache)
+        self.assertNotIn('b', cache)
+
+    def test_clear(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.get('a')
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+
+
+class TestCachedNPV(unittest.TestCase):
+
+    args = (2, 10, 0.8, [Decimal('751.5')] * 21,
+            parse_date('2018-04-27T09:58:56.919991+03:00'), Decimal('0.135'))
+
+    def setUp(self):
+        NPV_CACHE.clear()
+
+    @patch('openprocurement.contracting.esco.utils.npv')
+    def test_cached_npv(self, mocked_npv):
+        mocked_npv.return_value = Fraction(1, 3)
+        self.assertEqual(cached_npv(*self.args), Fraction(1, 3))
+        self.assertEqual(cached_npv(*self.args), Fraction(1, 3))
+        self.assertEqual(mocked_npv.call_count, 1)
+        self.assertEqual((NPV_CACHE.hits, NPV_CACHE.misses), (1, 1))
+
+    @patch('openprocurement.contracting.esco.utils.npv')
+    def test_announcement_date_timezone(self, mocked_npv):
+        # same moment, but another calendar day, must not share cache entry
+        args = list(self.args)
+        args[4] = parse_date('2018-01-01T00:30:00+02:00')
+        cached_npv(*args)
+        args[4] = parse_date('2017-12-31T22:30:00+00:00')
+        cached_npv(*args)
+        self.assertEqual(mocked_npv.call_count, 2)
+
+
+class TestKopecks(unittest.TestCase):
+
+    def test_to_kopecks(self):
+        self.assertEqual(to_kopecks(Decimal('751.505')), 75151)
+        self.assertEqual(to_kopecks('751.5049'), 75150)
+        self.assertEqual(to_kopecks(1000), 100000)
+        self.assertEqual(to_kopecks(0.00), 0)
+        self.assertEqual(from_kopecks(75150), Decimal('751.50'))
+
+    def test_fraction_to_kopecks(self):
+        for fraction in (Fraction(1, 3), Fraction(2, 3), Fraction(1, 200), Fraction(-1, 200), Fraction(150301, 200),
+                         Fraction(10 ** 30 + 1, 2 * 10 ** 30) / 100, Fraction(10 ** 30 - 1, 2 * 10 ** 30) / 100):
+            self.assertEqual(fraction_to_kopecks(fraction), to_kopecks(to_decimal(fraction)), fraction)
+
+
+class TestPaymentsTable(unittest.TestCase):
+
+    announcement_date = parse_date('2018-04-27T09:58:56.919991+03:00')
+    parameters = [
+        (2, 10, 0.8, [Decimal('751.5')] * 21),
+        (2, 10, 0.9, [Decimal('751.5')] * 21),
+        (15, 0, 0.8, [Decimal('100')] * 21),
+    ]
+
+    def setUp(self):
+        DISCOUNT_RATE_DAYS_CACHE.clear()
+        PAYMENTS_CACHE.clear()
+
+    def test_same_as_esculator(self):
+        table = calculate_payments_table(self.announcement_date, self.parameters)
+        days_for_discount_rate = discount_rate_days(self.announcement_date, 365, 20)
+        for (years, days, percentage, reduction), payments in zip(self.parameters, table):
+            self.assertEqual(payments, calculate_payments(
+                percentage, reduction, payments_days(years, days, days_for_discount_rate, 365, 20),
+                days_for_discount_rate
+            ))
+
+    @patch('openprocurement.contracting.esco.utils.calculate_payments')
+    @patch('openprocurement.contracting.esco.utils.payments_days')
+    @patch('openprocurement.contracting.esco.utils.discount_rate_days')
+    def test_shared_day_grid(self, discount_rate_days, payments_days, calculate_payments):
+        calculate_payments_table(self.announcement_date, self.parameters)
+        self.assertEqual(discount_rate_days.call_count, 1)
+        self.assertEqual(payments_days.call_count, 2)
+        self.assertEqual(calculate_payments.call_count, 3)
+        calculate_payments_table(self.announcement_date, self.parameters)
+        self.assertEqual(PAYMENTS_CACHE.hits, 3)
+        self.assertEqual(payments_days.call_count, 2)
+
+
+class TestNPVGrid(unittest.TestCase):
+
+    def setUp(self):
+        NPV_GRID_CACHE.clear()
+
+    def test_same_as_amount_performance(self):
+        data = deepcopy(test_contract_data)
+        discount_rates = [Decimal('0.1'), Decimal(str(data['NBUdiscountRate']))]
+        durations = [(5, 0), (10, 180), (15, 0)]
+        grid = npv_grid(Contract(data), discount_rates, durations)
+        self.assertEqual(len(grid), 6)
+        for point in grid:
+            data['NBUdiscountRate'] = point['NBUdiscountRate']
+            data['value']['contractDuration'] = point['contractDuration']
+            amount_performance = Contract(data).value.amountPerformance_npv
+            self.assertEqual(point['amountPerformance'], from_kopecks(to_kopecks(amount_performance)))
+
+
+class TestSerializeItems(unittest.TestCase):
+
+    def milestone(self, sequence_number, status):
+        return Milestone({
+            "sequenceNumber": sequence_number,
+            "title": "Milestone #{}".format(sequence_number),
+            "value": {'amount': 1000, 'currency': 'UAH', 'valueAddedTaxIncluded': True},
+            "status": status
+        })
+
+    def test_serialize_items(self):
+        milestones = [self.milestone(1, 'pending'), self.milestone(2, 'scheduled'), self.milestone(3, 'spare')]
+        data = list(serialize_items(milestones, attrgetter('status')))
+        self.assertEqual([i['sequenceNumber'] for i in data], [1, 2])
+        self.assertEqual(data[0], milestones[0].serialize('pending'))
+
+    def test_empty_role_not_serialized(self):
+        milestone = self.milestone(1, 'spare')
+        milestone.serialize = MagicMock()
+        self.assertEqual(list(serialize_items([milestone], 'view')), [])
+        self.assertFalse(milestone.serialize.called)
+
+
+class TestSerializeProjection(unittest.TestCase):
+
+    def test_projection(self):
+        contract = Contract(deepcopy(test_contract_data))
+        milestone = contract.milestones[0]
+        fields = frozenset(['id', 'status', 'amountPaid'])
+        self.assertEqual(
+            serialize_projection(milestone, milestone.status, fields),
+            dict((k, v) for k, v in milestone.serialize(milestone.status).items() if k in fields))
+        self.assertEqual(serialize_projection(milestone, milestone.status), milestone.serialize(milestone.status))
+
+    def test_role_is_applied(self):
+        milestone = Contract(deepcopy(test_contract_data)).milestones[-1]
+        milestone.status = 'spare'
+        self.assertEqual(serialize_projection(milestone, 'spare', frozenset(['id', 'status'])), {})
+
+    @patch('openprocurement.contracting.esco.models.cached_npv')
+    def test_not_requested_serializables(self, mocked_cached_npv):
+        contract = Contract(deepcopy(test_contract_data))
+        data = serialize_projection(contract, 'view', frozenset(['id', 'status']))
+        self.assertEqual(set(data), {'id', 'status'})
+        self.assertFalse(mocked_cached_npv.called)
+
+
+class TestGenerateMilestonesBatch(unittest.TestCase):
+
+    @staticmethod
+    def strip_generated(milestones):
+        for milestone in milestones:
+            for key in ('id', 'date', 'dateModified'):
+                del milestone[key]
+        return milestones
+
+    def test_same_as_generate_milestones(self):
+        contracts = []
+        for mode in (None, 'test'):
+            for years in (0, 3, 15):
+                contract = deepcopy(test_contract_data)
+                del contract['milestones']
+                contract['value']['contractDuration']['years'] = years
+                if mode:
+                    contract['mode'] = mode
+                contracts.append(contract)
+        expected_contracts = deepcopy(contracts)
+        expected = [self.strip_generated(generate_milestones(c)) for c in expected_contracts]
+        result = [self.strip_generated(m) for m in generate_milestones_batch(contracts)]
+        self.assertEqual(result, expected)
+        self.assertEqual(contracts, expected_contracts)
+
+    @patch('openprocurement.contracting.esco.utils.PAYMENTS_CACHE', LRUCache(1))
+    def test_schedules_calculated_once(self):
+        contracts = []
+        for years in (0, 3, 15):
+            contract = deepcopy(test_contract_data)
+            del contract['milestones']
+            contract['value']['contractDuration']['years'] = years
+            contracts.append(contract)
+        with patch('openprocurement.contracting.esco.utils.calculate_payments',
+                   side_effect=calculate_payments) as mocked_calculate_payments:
+            generate_milestones_batch(contracts + deepcopy(contracts))
+        self.assertEqual(mocked_calculate_payments.call_count, 3)
+
+
+class TestLocalizedYearStart(unittest.TestCase):
+
+    def test_year_starts(self):
+        for year in (2017, 2018, 2060, 2100):
+            year_start = localized_year_start(year)
+            self.assertEqual(year_start, TZ.localize(datetime(year, 1, 1)))
+            self.assertEqual(year_start.isoformat(), TZ.localize(datetime(year, 1, 1)).isoformat())
+            self.assertIs(localized_year_start(year), year_start)
+        self.assertIn(2100, YEAR_STARTS)
+
+
+def string_accelerate_milestones(milestones, days_per_year, accelerator):
+    """ accelerate_milestones on isoformat strings, as it was before typed periods """
+    year = timedelta(seconds=timedelta(days=days_per_year).total_seconds() / accelerator)
+    for index, milestone in enumerate(milestones):
+        period = milestone['period']
+        delta = parse_date(period['endDate']) - parse_date(period['startDate'])
+        if index == 0:
+            start_date = parse_date(period['startDate'])
+        elif milestone['status'] == 'spare' and milestones[index - 1]['status'] in ('scheduled', 'pending'):
+            start_date = parse_date(milestones[index - 1]['period']['startDate']) + year
+            period['startDate'] = start_date.isoformat()
+        else:
+            period['startDate'] = milestones[index - 1]['period']['endDate']
+            start_date = parse_date(period['startDate'])
+        period['endDate'] = (start_date + timedelta(seconds=delta.total_seconds() / accelerator)).isoformat()
+
+
+class TestAccelerateMilestones(unittest.TestCase):
+
+    def test_same_as_string_acceleration(self):
+        for years in (0, 3, 15):
+            contract = deepcopy(test_contract_data)
+            del contract['milestones']
+            contract['value']['contractDuration']['years'] = years
+            milestones = generate_milestones(deepcopy(contract))
+            for accelerator in (1440, 86400):
+                expected = deepcopy(milestones)
+                string_accelerate_milestones(expected, DAYS_PER_YEAR, accelerator)
+                result = deepcopy(milestones)
+                accelerate_milestones(result, DAYS_PER_YEAR, accelerator)
+                self.assertEqual(result, expected)
+
+                contract['procurementMethodDetails'] = 'quick, accelerator={}'.format(accelerator)
+                generated = generate_milestones(deepcopy(contract))
+                self.assertEqual([m['period'] for m in generated], [m['period'] for m in expected])
+
+
+class TestCheckMilestonesTotals(unittest.TestCase):
+
+    def test_check_milestones_totals(self):
+        milestones = deepcopy(test_contract_data['milestones'])
+        consistent = Contract({'milestones': milestones})
+        consistent.get_milestones_totals()
+        inconsistent = Contract({'milestones': milestones})
+        inconsistent.get_milestones_totals().amountPaid += 1
+        missed = Contract({'milestones': milestones})
+
+        result = list(check_milestones_totals([consistent, inconsistent, missed]))
+        self.assertEqual([i[0] for i in result], [inconsistent, missed])
+        self.assertIsNone(missed.milestonesTotals)
+        self.assertNotEqual(inconsistent.milestonesTotals.amountPaid, consistent.milestonesTotals.amountPaid)
+
+        list(check_milestones_totals([inconsistent, missed], fix=True))
+        self.assertEqual(inconsistent.milestonesTotals.amountPaid, consistent.milestonesTotals.amountPaid)
+        self.assertEqual(missed.milestonesTotals.value, consistent.milestonesTotals.value)
+
+
+class TestContractSnapshot(unittest.TestCase):
+
+    def test_materialize(self):
+        contract = Contract(deepcopy(test_contract_data))
+        src = contract.serialize('plain')
+        snapshot = ContractSnapshot(contract)
+        milestone = contract.milestones[0]
+        snapshot.touch_milestones(milestone)
+        contribution = milestone.get_totals_contribution()
+        milestone.status = 'met'
+        milestone.amountPaid.amount = milestone.value.amount
+        contract.update_milestones_totals(contribution, milestone.get_totals_contribution())
+        data = contract.serialize('plain')
+        self.assertNotEqual(data, src)
+        self.assertEqual(snapshot.materialize(data), src)
+        # not touched subtrees are shared
+        self.assertIs(snapshot.materialize(data)['milestones'][1], data['milestones'][1])
+
+
+class TestContractState(unittest.TestCase):
+
+    def test_contract_state(self):
+        data = deepcopy(test_contract_data)
+        data['procurementMethodDetails'] = 'quick, accelerator=1440'
+        data['milestones'][1]['status'] = 'met'
+        state = ContractState(Contract(data))
+        self.assertIsNone(state.pending_change)
+        self.assertEqual([i.sequenceNumber for i in state.pending_milestones], [1])
+        self.assertEqual([i.sequenceNumber for i in state.terminated_milestones], [2])
+        self.assertEqual(state.accelerator, 1440)
+        # state is calculated once
+        state.contract.milestones[0].status = 'met'
+        self.assertEqual(len(state.pending_milestones), 1)
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestLRUCache))
+    suite.addTest(unittest.makeSuite(TestCachedNPV))
+    suite.addTest(unittest.makeSuite(TestKopecks))
+    suite.addTest(unittest.makeSuite(TestPaymentsTable))
+    suite.addTest(unittest.makeSuite(TestNPVGrid))
+    suite.addTest(unittest.makeSuite(TestSerializeItems))
+    suite.addTest(unittest.makeSuite(TestSerializeProjection))
+    suite.addTest(unittest.makeSuite(TestGenerateMilestonesBatch))
+    suite.addTest(unittest.makeSuite(TestLocalizedYearStart))
+    suite.addTest(unittest.makeSuite(TestAccelerateMilestones))
+    suite.addTest(unittest.makeSuite(TestCheckMilestonesTotals))
+    suite.addTest(unittest.makeSuite(TestContractSnapshot))
+    suite.addTest(unittest.makeSuite(TestContractState))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
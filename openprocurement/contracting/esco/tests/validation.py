@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import unittest
+from copy import deepcopy
+from datetime import timedelta
+
+from mock import patch
+
+from openprocurement.api.utils import get_now
+from openprocurement.contracting.esco.benchmarks.baseline import milestone_patch_validators
+from openprocurement.contracting.esco.models import Contract
+from openprocurement.contracting.esco.tests.base import test_contract_data
+from openprocurement.contracting.esco.utils import get_contract_state
+from openprocurement.contracting.esco.validation import validate_milestone_patch
+
+
+class OperationError(Exception):
+    pass
+
+
+def raise_operation_error(request, message):
+    raise OperationError(message)
+
+
+class Request(object):
+
+    def __init__(self, context, data):
+        self.context = context
+        self.validated = {'data': data, 'contract': context.__parent__}
+
+
+@patch('openprocurement.contracting.esco.validation.raise_operation_error', raise_operation_error)
+@patch('openprocurement.contracting.esco.benchmarks.baseline.raise_operation_error', raise_operation_error)
+class TestValidateMilestonePatch(unittest.TestCase):
+
+    def get_error(self, validate, request):
+        get_contract_state(request, reset=True)
+        try:
+            validate(request)
+        except OperationError as e:
+            return e.args[0]
+
+    def test_same_as_baseline_validators(self):
+        def validate_all(request):
+            for validator in milestone_patch_validators:
+                validator(request)
+
+        statuses = ['scheduled', 'met', 'notMet', 'partiallyMet', 'pending', 'spare']
+        for status in statuses:
+            for new_status in statuses:
+                for amount_paid in (0, 1, 10 ** 9):
+                    for value in (None, 1):
+                        contract = Contract(deepcopy(test_contract_data))
+                        milestone = contract.milestones[1]
+                        milestone.__parent__ = contract
+                        milestone.status = status
+                        milestone.period.startDate = get_now() - timedelta(days=1)
+                        data = milestone.serialize('edit')
+                        data['status'] = new_status
+                        data['amountPaid']['amount'] = amount_paid
+                        if value is not None:
+                            data['value']['amount'] = value
+                        request = Request(milestone, data)
+                        self.assertEqual(self.get_error(validate_milestone_patch, request),
+                                         self.get_error(validate_all, request))
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(TestValidateMilestonePatch))
+    return suite
+
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='suite')
@@ -1,22 +1,42 @@
 # -*- coding: utf-8 -*-
 import os
-from decimal import Decimal
-from copy import deepcopy
+from hashlib import md5
+from decimal import Decimal, ROUND_HALF_UP
+from collections import OrderedDict
 from pytz import timezone
 from iso8601 import parse_date
 from datetime import datetime, timedelta
+from timeit import default_timer
 from uuid import uuid4
 from cornice.resource import resource
 from functools import partial
+from pyramid.decorator import reify
+from pyramid.httpexceptions import HTTPNotModified
+from schematics.transforms import Role, export_loop
 
-from openprocurement.api.traversal import get_item
+from openprocurement.api.models import Model
 from openprocurement.api.utils import error_handler
 from openprocurement.contracting.api.traversal import Root
-from openprocurement.contracting.esco.constants import ACCELERATOR_RE, DAYS_PER_YEAR
+from openprocurement.contracting.core.utils import save_contract
+from openprocurement.contracting.esco.metrics import timed, inc, observe, add_transition, COUNT_BUCKETS
+from openprocurement.contracting.esco.constants import (
+    ACCELERATOR_RE, DAYS_PER_YEAR, NPV_CACHE_SIZE, NPV_CALCULATION_DURATION, PAYMENTS_CACHE_SIZE,
+    MILESTONES_PREVIEW_CACHE_SIZE, PROJECTIONS_CACHE_SIZE, NPV_GRID_CACHE_SIZE, YEAR_STARTS_RANGE, TERMINATED_STATUSES,
+)
+
+from esculator import npv
+from esculator.calculations import (
+    discount_rate_days, payments_days, calculate_payments,
+    calculate_income, calculate_discount_rates, calculate_discounted_income,
+)
 
-from esculator.calculations import discount_rate_days, payments_days, calculate_payments
 
 def factory(request):
+    with timed(request, 'factory'):
+        return _factory(request)
+
+
+def _factory(request):
     request.validated['contract_src'] = {}
     root = Root(request)
     if not request.matchdict or not request.matchdict.get('contract_id'):
@@ -25,35 +45,607 @@ def factory(request):
     contract = request.contract
     contract.__parent__ = root
     request.validated['contract'] = request.validated['db_doc'] = contract
+    request.validated['contract_state'] = ContractState(contract)
     if request.method != 'GET':
-        request.validated['contract_src'] = contract.serialize('plain')
+        request.validated['contract_snapshot'] = ContractSnapshot(contract)
     if request.matchdict.get('milestone_id'):
-        return get_item(contract, 'milestone', request)
+        return get_indexed_item(contract, 'milestone', request)
     request.validated['id'] = request.matchdict['contract_id']
     return contract
 
 
+def get_indexed_item(parent, key, request):
+    """ openprocurement.api.traversal.get_item using contract items index """
+    item_id = request.matchdict['{}_id'.format(key)]
+    request.validated['{}_id'.format(key)] = item_id
+    item = parent.get_items_index('{}s'.format(key)).get(item_id)
+    if item is None:
+        request.errors.add('url', '{}_id'.format(key), 'Not Found')
+        request.errors.status = 404
+        raise error_handler(request.errors)
+    request.validated[key] = item
+    request.validated['id'] = item_id
+    item.__parent__ = parent
+    return item
+
+
+class ContractState(object):
+    """
+    State derived from contract, which is calculated once per request and
+    shared by validators. It should be reset (see get_contract_state) if
+    request changes contract before further validation.
+    """
+
+    def __init__(self, contract):
+        self.contract = contract
+
+    @reify
+    def pending_change(self):
+        changes = self.contract.changes
+        return changes[-1] if changes and changes[-1].status == 'pending' else None
+
+    @reify
+    def pending_milestones(self):
+        return [i for i in self.contract.milestones if i.status == 'pending']
+
+    @reify
+    def terminated_milestones(self):
+        return [i for i in self.contract.milestones if i.status in TERMINATED_STATUSES]
+
+    @reify
+    def accelerator(self):
+        return get_accelerator(self.contract.procurementMethodDetails)
+
+
+def get_contract_state(request, reset=False):
+    """ Request-scoped ContractState of request.validated['contract'] """
+    state = request.validated.get('contract_state')
+    if state is None or reset:
+        state = request.validated['contract_state'] = ContractState(request.validated['contract'])
+    return state
+
+
+class ContractSnapshot(object):
+    """
+    Copy-on-write replacement of contract.serialize('plain') revision source.
+
+    Contract subtrees are serialized only when they are touched, i.e. right
+    before request changes them. Revision source is assembled from contract
+    serialization made on save, all not touched subtrees are shared with it.
+    """
+
+    # serialized names of contract serializables
+    serializables = {'amountPaid': 'contract_amountPaid'}
+    # contract fields which are derived from milestones
+    milestones_derived_fields = ('milestonesTotals', 'value', 'amountPaid')
+
+    def __init__(self, contract):
+        self.contract = contract
+        self.fields = {}
+        self.milestones = {}
+
+    def touch(self, *keys):
+        """ Snapshot top level contract fields by their serialized names """
+        for key in keys:
+            if key not in self.fields:
+                self.fields[key] = self._serialize(key)
+
+    def touch_milestones(self, *milestones):
+        """ Snapshot milestones and contract fields derived from them """
+        self.touch(*self.milestones_derived_fields)
+        for milestone in milestones:
+            if milestone.id not in self.milestones:
+                self.milestones[milestone.id] = milestone.serialize()
+
+    def _serialize(self, key):
+        value = getattr(self.contract, self.serializables.get(key, key))
+        # nested models have no plain role, contract.serialize('plain') exports them with default one
+        if isinstance(value, Model):
+            return value.serialize()
+        if isinstance(value, list):
+            return [i.serialize() if isinstance(i, Model) else i for i in value]
+        return value
+
+    def materialize(self, data):
+        """
+        Revision source for contract plain serialization
+
+        :param data: current contract.serialize('plain')
+        :return: contract data as it was before changes
+        :rtype: dict
+        """
+        src = dict(data)
+        for key, value in self.fields.items():
+            if value is None:
+                src.pop(key, None)
+            else:
+                src[key] = value
+        if self.milestones and 'milestones' in data:
+            src['milestones'] = [self.milestones.get(i['id'], i) for i in data['milestones']]
+        return src
+
+
+def save_contract_snapshot(request):
+    """
+    Save contract with openprocurement.contracting.core.utils.save_contract,
+    revision source is materialized from request.validated['contract_snapshot'].
+
+    :param request
+    :return: True if contract is saved
+    """
+    contract = request.validated['contract']
+    snapshot = request.validated['contract_snapshot']
+    if contract.mode == u'test':
+        # save_contract sets test mode titles
+        snapshot.touch('title', 'title_en', 'title_ru')
+    request.validated['contract_src'] = snapshot.materialize(contract.serialize('plain'))
+    return save_contract(request)
+
+
 milestoneresource = partial(
     resource,
     error_handler=error_handler,
     factory=factory
 )
 
+def is_empty_role(model, role):
+    """ Check if model role is an empty whitelist, i.e. serializes to nothing """
+    role_filter = model._options.roles.get(role)
+    return role_filter is not None and role_filter.function is Role.whitelist and not role_filter.fields
+
+
+def serialize_items(items, role, fields=None):
+    """
+    Lazily serialize collection items, each of them only once. Items in roles
+    with an empty whitelist (e.g. 'spare' milestones) are skipped without
+    serialization.
+
+    :param items: iterable of models
+    :param role: role name or callable returning role name for an item
+    :param fields: optional projection, see serialize_projection
+    :return: generator of serialized items
+    """
+    for item in items:
+        item_role = role(item) if callable(role) else role
+        if is_empty_role(item, item_role):
+            continue
+        data = serialize_projection(item, item_role, fields)
+        if data:
+            yield data
+
+
+# fields are always serialized in projections
+PROJECTION_REQUIRED_FIELDS = frozenset(['id'])
+
+
+def get_opt_fields(request):
+    """
+    Projection requested by opt_fields query parameter (comma separated
+    serialized field names), or None if it isn't requested.
+
+    :rtype: frozenset
+    """
+    opt_fields = request.params.get('opt_fields')
+    if not opt_fields:
+        return None
+    return frozenset(i.strip() for i in opt_fields.split(',') if i.strip()) | PROJECTION_REQUIRED_FIELDS
+
+
+def get_projection(model_class, fields):
+    """
+    Subclass of model_class, which has only fields and serializables with
+    serialized names in fields. Roles are inherited, so fields are still
+    filtered by role, but fields out of projection are neither exported
+    nor calculated (serializables).
+    """
+    projected = dict((attr, OrderedDict(
+        (name, field) for name, field in getattr(model_class, attr).items()
+        if (field.serialized_name or name) in fields
+    )) for attr in ('_fields', '_serializables'))
+    key = (model_class, tuple(projected['_fields']), tuple(projected['_serializables']))
+    projection = PROJECTIONS.get(key)
+    if projection is None:
+        projection = type(model_class)(model_class.__name__, (model_class,), {'__module__': model_class.__module__})
+        for attr, value in projected.items():
+            setattr(projection, attr, value)
+        PROJECTIONS.put(key, projection)
+    return projection
+
+
+def serialize_projection(model, role, fields=None):
+    """
+    model.serialize(role) restricted to fields projection.
+
+    :param model: model instance
+    :param role: role name
+    :param fields: set of serialized field names, None for all fields
+    :return: serialized model, empty dict if nothing is exported
+    """
+    if fields is None:
+        return model.serialize(role)
+    data = export_loop(get_projection(model.__class__, fields), model,
+                       lambda field, value: field.to_primitive(value), role=role, raise_error_on_role=True)
+    return data or {}
+
+
+# ETag of projection is "<version>-<opt_fields hash>"
+ETAG_PROJECTION_SEPARATOR = '-'
+
+
+def get_milestones_version(request, milestone=None):
+    """
+    Version tag of milestones listing or of milestone, if passed, derived
+    from contract revision and milestone dateModified. It doesn't depend on
+    representation, so it is compared with If-Match.
+    """
+    contract = request.validated['contract']
+    parts = [contract.rev or '']
+    if milestone is not None:
+        parts += [milestone.id, milestone.dateModified.isoformat() if milestone.dateModified else '']
+    return md5(u'|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def get_milestones_etag(request, milestone=None):
+    """
+    Strong entity tag of milestones listing or of milestone representation:
+    version tag and requested projection.
+    """
+    etag = get_milestones_version(request, milestone)
+    fields = get_opt_fields(request)
+    if fields:
+        etag += ETAG_PROJECTION_SEPARATOR + md5(u','.join(sorted(fields)).encode('utf-8')).hexdigest()
+    return etag
+
+
+def etag_version(etag):
+    """ Version tag of entity tag """
+    return etag.split(ETAG_PROJECTION_SEPARATOR)[0]
+
+
+def check_not_modified(request, etag):
+    """ Respond 304 Not Modified if client has the representation with etag (If-None-Match) """
+    if etag in request.if_none_match:
+        raise HTTPNotModified(headers={'ETag': '"{}"'.format(etag)})
+    request.response.etag = etag
+
+
+def prefer_minimal(request):
+    """ Check if client prefers minimal response (Prefer: return=minimal, RFC 7240) """
+    preferences = [i.strip() for i in request.headers.get('Prefer', '').split(',')]
+    if 'return=minimal' in preferences:
+        request.response.headers['Preference-Applied'] = 'return=minimal'
+        return True
+    return False
+
+
+def minimal_representation(model):
+    """ Minimal response data of updated model """
+    return {'id': model.id, 'dateModified': model.dateModified.isoformat()}
+
+
 TZ = timezone(os.environ['TZ'] if 'TZ' in os.environ else 'Europe/Kiev')
 
 
+class LRUCache(object):
+    """ Bounded mapping which evicts least recently used entries """
+
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        if len(self._data) > self.size:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+NPV_CACHE = LRUCache(NPV_CACHE_SIZE)
+PROJECTIONS = LRUCache(PROJECTIONS_CACHE_SIZE)
+
+
+def npv_cache_key(contract_duration_years, contract_duration_days, yearly_payments_percentage,
+                  annual_costs_reduction, announcement_date, nbu_discount_rate):
+    # announcement date is keyed by its isoformat, because equal datetimes
+    # in different timezones may fall on different calendar days
+    return (
+        contract_duration_years,
+        contract_duration_days,
+        yearly_payments_percentage,
+        tuple(annual_costs_reduction or ()),
+        announcement_date.isoformat() if announcement_date else None,
+        nbu_discount_rate,
+    )
+
+
+def cached_npv(contract_duration_years, contract_duration_days, yearly_payments_percentage,
+               annual_costs_reduction, announcement_date, nbu_discount_rate):
+    """
+    Memoized esculator.npv. Results are kept in NPV_CACHE, so repeated
+    serializations of unchanged contracts don't recalculate discounted
+    cash flow.
+
+    :return: npv
+    :rtype: Fraction
+    """
+    key = npv_cache_key(contract_duration_years, contract_duration_days, yearly_payments_percentage,
+                        annual_costs_reduction, announcement_date, nbu_discount_rate)
+    result = NPV_CACHE.get(key)
+    if result is None:
+        start = default_timer()
+        result = npv(contract_duration_years, contract_duration_days, yearly_payments_percentage,
+                     annual_costs_reduction, announcement_date, nbu_discount_rate)
+        observe('esco_npv_seconds', default_timer() - start)
+        NPV_CACHE.put(key, result)
+        inc('esco_npv_computations_total', cache='miss')
+    else:
+        inc('esco_npv_computations_total', cache='hit')
+    return result
+
+
+NPV_GRID_CACHE = LRUCache(NPV_GRID_CACHE_SIZE)
+
+
+def npv_grid(contract, discount_rates, durations):
+    """
+    amountPerformance (ESCOValue.amountPerformance_npv) of the contract over
+    grid of NBUdiscountRate values and contract durations, calculated as
+    esculator.npv does, over shared day grid: discount rate days are
+    calculated once for the announcement date, payments and income once
+    per duration and discount rates once per NBUdiscountRate value. Grids
+    are cached by contract revision.
+
+    :param contract: ESCO contract model
+    :param discount_rates: list of NBUdiscountRate values
+    :param durations: list of (years, days) contract durations
+    :return: list of NBUdiscountRate, contractDuration, amountPerformance
+        dicts, rates major
+    :rtype: list
+    """
+    key = (contract.id, contract.rev, tuple(discount_rates), tuple(durations))
+    grid = NPV_GRID_CACHE.get(key)
+    if grid is None:
+        value = contract.value
+        start = default_timer()
+        days_for_discount_rate = get_discount_rate_days(contract.noticePublicationDate)
+        payments_table = calculate_payments_table(contract.noticePublicationDate, [
+            (years, days, value.yearlyPaymentsPercentage, value.annualCostsReduction) for years, days in durations
+        ])
+        incomes = [calculate_income(value.annualCostsReduction, payments) for payments in payments_table]
+        grid = []
+        for discount_rate in discount_rates:
+            rates = calculate_discount_rates(days_for_discount_rate, discount_rate)
+            for (years, days), income in zip(durations, incomes):
+                grid.append({
+                    'NBUdiscountRate': discount_rate,
+                    'contractDuration': {'years': years, 'days': days},
+                    'amountPerformance': from_kopecks(fraction_to_kopecks(
+                        sum(calculate_discounted_income(income, rates)))),
+                })
+        observe('esco_npv_grid_seconds', default_timer() - start)
+        NPV_GRID_CACHE.put(key, grid)
+    return grid
+
+
+def check_milestones_totals(contracts, fix=False):
+    """
+    Recalculate milestones totals stored with contracts in bulk.
+
+    :param contracts: iterable of ESCO contract models
+    :param fix: keep recalculated totals in inconsistent contracts
+    :return: generator of (contract, stored totals, recalculated totals)
+        for contracts with missed or inconsistent totals
+    """
+    for contract in contracts:
+        stored = contract.milestonesTotals
+        recalculated = contract.recalculate_milestones_totals()
+        if stored is None or \
+                (stored.value, stored.amountPaid) != (recalculated.value, recalculated.amountPaid):
+            if not fix:
+                contract.milestonesTotals = stored
+            yield contract, stored, recalculated
+        else:
+            contract.milestonesTotals = stored
+
+
 def to_decimal(fraction):
     return str(Decimal(fraction.numerator) / Decimal(fraction.denominator))
 
 
-def generate_milestones(contract):
-    accelerator = 0
-    if 'procurementMethodDetails' in contract:
-        re_obj = ACCELERATOR_RE.search(contract['procurementMethodDetails'])
-        if re_obj and 'accelerator' in re_obj.groupdict():
-            accelerator = int(re_obj.groupdict()['accelerator'])
+# Money amounts are aggregated in integer kopecks and converted to Decimal
+# only at schematics models boundary. Rounding is the same as of amounts
+# fields DecimalType(precision=-2): half up to 0.01.
+KOPECK = Decimal('0.01')
+# to_decimal precision, see fraction_to_kopecks
+DECIMAL_DIGITS = 28
+
+
+def to_kopecks(amount):
+    """
+    Money amount (Decimal, string or number) as integer kopecks
+
+    :rtype: int
+    """
+    return int(Decimal(amount).quantize(KOPECK, rounding=ROUND_HALF_UP).scaleb(2))
+
+
+def from_kopecks(kopecks):
+    """
+    Integer kopecks as Decimal money amount
+
+    :rtype: Decimal
+    """
+    return Decimal(kopecks).scaleb(-2)
+
+
+def fraction_to_kopecks(fraction):
+    """
+    Fraction money amount as integer kopecks, same as
+    to_kopecks(to_decimal(fraction)), but in integer arithmetic.
+
+    :rtype: int
+    """
+    numerator = abs(fraction.numerator) * 100
+    denominator = fraction.denominator
+    kopecks, remainder = divmod(numerator, denominator)
+    # distance to half of kopeck, in 1 / (2 * denominator) units
+    half = 2 * remainder - denominator
+    if abs(half) * 10 ** (DECIMAL_DIGITS - 2) <= 2 * denominator * (kopecks + 1):
+        # value is too close to half of kopeck, to_decimal rounding of
+        # division to DECIMAL_DIGITS digits may round it another way
+        return to_kopecks(to_decimal(fraction))
+    if half > 0:
+        kopecks += 1
+    return kopecks if fraction >= 0 else -kopecks
+
+
+DISCOUNT_RATE_DAYS_CACHE = LRUCache(PAYMENTS_CACHE_SIZE)
+PAYMENTS_CACHE = LRUCache(PAYMENTS_CACHE_SIZE)
+
+
+def get_discount_rate_days(announcement_date):
+    """
+    esculator discount_rate_days vector, cached by announcement date
+    isoformat (see npv_cache_key)
+    """
+    key = announcement_date.isoformat()
+    days_for_discount_rate = DISCOUNT_RATE_DAYS_CACHE.get(key)
+    if days_for_discount_rate is None:
+        days_for_discount_rate = discount_rate_days(announcement_date, DAYS_PER_YEAR, NPV_CALCULATION_DURATION)
+        DISCOUNT_RATE_DAYS_CACHE.put(key, days_for_discount_rate)
+    return days_for_discount_rate
+
+
+def calculate_payments_table(announcement_date, parameters):
+    """
+    Payments schedules of contracts announced at announcement_date. All
+    schedules share discount rate days vector of the announcement date and
+    payments days are calculated once per contract duration. Schedules are
+    cached in PAYMENTS_CACHE, so they must not be changed.
+
+    :param announcement_date: contracts announcement date
+    :param parameters: iterable of (contract duration years, contract duration
+        days, yearly payments percentage, annual costs reduction)
+    :return: list of payments schedules, in order of parameters
+    :rtype: list
+    """
+    days_for_discount_rate = None
+    days_with_payments = {}
+    schedules = {}  # schedules of this table don't depend on PAYMENTS_CACHE size
+    table = []
+    for years, days, yearly_payments_percentage, annual_cost_reduction in parameters:
+        key = (announcement_date.isoformat(), years, days, yearly_payments_percentage, tuple(annual_cost_reduction))
+        payments = schedules.get(key)
+        if payments is None:
+            payments = PAYMENTS_CACHE.get(key)
+        if payments is None:
+            if days_for_discount_rate is None:
+                days_for_discount_rate = get_discount_rate_days(announcement_date)
+            if (years, days) not in days_with_payments:
+                days_with_payments[(years, days)] = payments_days(
+                    years, days, days_for_discount_rate, DAYS_PER_YEAR, NPV_CALCULATION_DURATION
+                )
+            payments = calculate_payments(
+                yearly_payments_percentage, annual_cost_reduction,
+                days_with_payments[(years, days)], days_for_discount_rate
+            )
+            PAYMENTS_CACHE.put(key, payments)
+        schedules[key] = payments
+        table.append(payments)
+    return table
+
+
+def calculate_milestones_payments(announcement_date, contract_duration_years, contract_duration_days,
+                                  yearly_payments_percentage, annual_cost_reduction):
+    return calculate_payments_table(announcement_date, [(
+        contract_duration_years, contract_duration_days, yearly_payments_percentage, annual_cost_reduction
+    )])[0]
+
+
+def build_year_starts(first_year, last_year):
+    return dict((year, TZ.localize(datetime(year, 1, 1))) for year in xrange(first_year, last_year + 1))
+
+
+# process-wide table of localized year starts, datetimes are immutable and shared
+YEAR_STARTS = {}
+
+
+def localized_year_start(year):
+    """
+    January 1 of year in TZ. YEAR_STARTS_RANGE years are localized on first
+    use (not on import), other years are added to the table on demand.
+    """
+    if not YEAR_STARTS:
+        YEAR_STARTS.update(build_year_starts(*YEAR_STARTS_RANGE))
+    year_start = YEAR_STARTS.get(year)
+    if year_start is None:
+        year_start = YEAR_STARTS[year] = TZ.localize(datetime(year, 1, 1))
+    return year_start
+
+
+def generate_milestones_batch(contracts):
+    """
+    Generate milestones for many contracts at once. Payments schedules are
+    calculated in tables per announcement date, so they are shared
+    between contracts with the same inputs (e.g. contracts of the same
+    tender), and passed to generate_milestones.
+    Result is the same as of generate_milestones applied to each contract,
+    except of generated milestones ids and dates.
+
+    :param contracts: list of contracts data
+    :return: list of milestones lists, in order of contracts
+    :rtype: list
+    """
+    announcements = OrderedDict()
+    for index, contract in enumerate(contracts):
+        value = contract['value']
+        indexes, parameters = announcements.setdefault(contract['noticePublicationDate'], ([], []))
+        indexes.append(index)
+        parameters.append((
+            value['contractDuration']['years'], value['contractDuration']['days'],
+            value['yearlyPaymentsPercentage'], value['annualCostsReduction']
+        ))
+    schedules = [None] * len(contracts)
+    for announcement_date, (indexes, parameters) in announcements.items():
+        for index, payments in zip(indexes, calculate_payments_table(parse_date(announcement_date), parameters)):
+            schedules[index] = payments
+    return [generate_milestones(contract, payments) for contract, payments in zip(contracts, schedules)]
+
+
+def generate_milestones(contract, payments=None):
+    """
+    :param contract: contract data, its period and dateSigned may be changed
+    :param payments: precalculated payments schedule of the contract,
+        it is calculated if missed
+    :return: list of milestones data
+    :rtype: list
+    """
+    start = default_timer()
+    accelerator = get_accelerator(contract.get('procurementMethodDetails'))
 
-    npv_calculation_duration = 20
     announcement_date = parse_date(contract['noticePublicationDate'])
 
     contract_days = timedelta(days=contract['value']['contractDuration']['days'])
@@ -78,22 +670,17 @@ def generate_milestones(contract):
     contract_start_date = parse_date(contract['period']['startDate'])
     contract_end_date = parse_date(contract['period']['endDate'])
 
-    contract_duration_years = contract['value']['contractDuration']['years']
-    contract_duration_days = contract['value']['contractDuration']['days']
-    yearly_payments_percentage = contract['value']['yearlyPaymentsPercentage']
-    annual_cost_reduction = contract['value']['annualCostsReduction']
-
-    days_for_discount_rate = discount_rate_days(announcement_date, DAYS_PER_YEAR, npv_calculation_duration)
-    days_with_payments = payments_days(
-        contract_duration_years, contract_duration_days, days_for_discount_rate, DAYS_PER_YEAR,
-        npv_calculation_duration
-    )
-
-    payments = calculate_payments(
-        yearly_payments_percentage, annual_cost_reduction, days_with_payments, days_for_discount_rate
-    )
+    if payments is None:
+        payments = calculate_milestones_payments(
+            announcement_date,
+            contract['value']['contractDuration']['years'],
+            contract['value']['contractDuration']['days'],
+            contract['value']['yearlyPaymentsPercentage'],
+            contract['value']['annualCostsReduction']
+        )
 
     milestones = []
+    periods = []  # (startDate, endDate) of milestones
     years_before_contract_start = contract_start_date.year - announcement_date.year
 
     last_milestone_sequence_number = 16 + years_before_contract_start
@@ -111,7 +698,8 @@ def generate_milestones(contract):
                 "valueAddedTaxIncluded": contract['value']['valueAddedTaxIncluded']
             },
             'value': {
-                "amount": to_decimal(payments[sequence_number - 1]) if sequence_number <= 21 else 0.00,
+                "amount": str(from_kopecks(fraction_to_kopecks(payments[sequence_number - 1])))
+                if sequence_number <= 21 else 0.00,
                 "currency": contract['value']['currency'],
                 "valueAddedTaxIncluded": contract['value']['valueAddedTaxIncluded']
             },
@@ -119,14 +707,14 @@ def generate_milestones(contract):
 
         if sequence_number == 1:
             milestone_start_date = announcement_date
-            milestone_end_date = TZ.localize(datetime(announcement_date.year + sequence_number, 1, 1))
+            milestone_end_date = localized_year_start(announcement_date.year + sequence_number)
             milestone['status'] = 'pending'
         elif sequence_number == last_milestone_sequence_number:
-            milestone_start_date = TZ.localize(datetime(announcement_date.year + sequence_number - 1, 1, 1))
+            milestone_start_date = localized_year_start(announcement_date.year + sequence_number - 1)
             milestone_end_date = contract_start_date + timedelta(days=DAYS_PER_YEAR * 15)
         else:
-            milestone_start_date = TZ.localize(datetime(announcement_date.year + sequence_number - 1, 1, 1))
-            milestone_end_date = TZ.localize(datetime(announcement_date.year + sequence_number, 1, 1))
+            milestone_start_date = localized_year_start(announcement_date.year + sequence_number - 1)
+            milestone_end_date = localized_year_start(announcement_date.year + sequence_number)
 
         if contract_end_date.year >= milestone_start_date.year and sequence_number != 1:
             milestone['status'] = 'scheduled'
@@ -136,16 +724,20 @@ def generate_milestones(contract):
         if contract_end_date.year == announcement_date.year + sequence_number - 1:
             milestone_end_date = contract_end_date
 
-        milestone['period'] = {
-            'startDate': milestone_start_date.isoformat(),
-            'endDate': milestone_end_date.isoformat()
-        }
+        periods.append((milestone_start_date, milestone_end_date))
         title = "Milestone #{} of year {}".format(sequence_number, milestone_start_date.year)
         milestone['title'] = title
         milestone['description'] = title
         milestones.append(milestone)
     if accelerator:
-        accelerate_milestones(milestones, DAYS_PER_YEAR, accelerator)
+        periods = accelerate_periods(periods, [m['status'] for m in milestones], DAYS_PER_YEAR, accelerator)
+    # periods are serialized once, after acceleration
+    for milestone, (milestone_start_date, milestone_end_date) in zip(milestones, periods):
+        milestone['period'] = {
+            'startDate': milestone_start_date.isoformat(),
+            'endDate': milestone_end_date.isoformat()
+        }
+    if accelerator:
         # restore accelerated contract.dateSigned
 
         contract['dateSigned'] = date_signed.isoformat()
@@ -156,43 +748,48 @@ def generate_milestones(contract):
             'startDate': contract['dateSigned'],
             'endDate': contract_end_date.isoformat()
         }
+    inc('esco_milestone_generations_total')
+    observe('esco_milestone_generation_seconds', default_timer() - start)
+    observe('esco_generated_milestones', len(milestones), COUNT_BUCKETS)
     return milestones
 
 
 def accelerate_milestones(milestones, days_per_year, accelerator):
+    """ Accelerate periods of milestones data in place, see accelerate_periods """
+    periods = accelerate_periods(
+        [(parse_date(m['period']['startDate']), parse_date(m['period']['endDate'])) for m in milestones],
+        [m['status'] for m in milestones], days_per_year, accelerator
+    )
+    for index, (milestone, (start_date, end_date)) in enumerate(zip(milestones, periods)):
+        if index:
+            milestone['period']['startDate'] = start_date.isoformat()
+        milestone['period']['endDate'] = end_date.isoformat()
+
+
+def accelerate_periods(periods, statuses, days_per_year, accelerator):
+    """
+    Accelerated milestones periods. Milestones follow each other, except of
+    the first spare one after scheduled, which starts an accelerated year
+    after the previous milestone start. Every period is shrunk by
+    accelerator.
+
+    :param periods: list of milestones (startDate, endDate) datetimes
+    :param statuses: list of milestones statuses
+    :return: list of accelerated (startDate, endDate)
+    :rtype: list
+    """
     year = timedelta(seconds=timedelta(days=days_per_year).total_seconds() / accelerator)
-    previous_end_date = None
-    for index, milestone in enumerate(milestones):
+    accelerated = []
+    for index, (start_date, end_date) in enumerate(periods):
+        delta = timedelta(seconds=(end_date - start_date).total_seconds() / accelerator)
         if index == 0:
-            start_date = parse_date(milestone['period']['startDate'])
-            end_date = parse_date(milestone['period']['endDate'])
-            delta = end_date - start_date
-            end_date = start_date + timedelta(seconds=delta.total_seconds() / accelerator)
-
-            milestone['period']['endDate'] = end_date.isoformat()
-        elif milestone['status'] == 'spare' and milestones[index - 1]['status'] in tuple(['scheduled', 'pending']):
-            previous_start_date = parse_date(milestones[index - 1]['period']['startDate'])
-            previous_end_date = previous_start_date + year
-            real_start_date = parse_date(milestone['period']['startDate'])
-            end_date = parse_date(milestone['period']['endDate'])
-            delta = end_date - real_start_date
-            end_date = previous_end_date + timedelta(seconds=delta.total_seconds() / accelerator)
-
-            milestone['period'] = {
-                'startDate': previous_end_date.isoformat(),
-                'endDate': end_date.isoformat()
-            }
+            pass
+        elif statuses[index] == 'spare' and statuses[index - 1] in ('scheduled', 'pending'):
+            start_date = accelerated[index - 1][0] + year
         else:
-            real_start_date = parse_date(milestone['period']['startDate'])
-            end_date = parse_date(milestone['period']['endDate'])
-
-            milestone['period']['startDate'] = milestones[index - 1]['period']['endDate']
-
-            start_date = parse_date(milestones[index - 1]['period']['endDate'])
-            delta = end_date - real_start_date
-            end_date = start_date + timedelta(seconds=delta.total_seconds() / accelerator)
-
-            milestone['period']['endDate'] = end_date.isoformat()
+            start_date = accelerated[index - 1][1]
+        accelerated.append((start_date, start_date + delta))
+    return accelerated
 
 
 def update_milestones_dates_and_statuses(request):
@@ -208,12 +805,45 @@ def update_milestones_dates_and_statuses(request):
     :return: None
     :rtype: None
     """
+    start = default_timer()
     contract = request.context
-    new_contract_end_date = parse_date(request.validated['data']['period']['endDate'])
-    milestones = request.context.milestones  # real milestones
-    target_milestones = deepcopy(request.validated['contract_src']['milestones'])
+    end_date = request.validated['data']['period']['endDate']
+    target_milestones = get_milestones_dates_and_statuses(
+        contract, request.validated['contract_src']['milestones'], end_date, get_contract_state(request)
+    )
+    for m, target in zip(contract.milestones, target_milestones):
+        if m.status != target['status']:
+            add_transition(request, m.status, target['status'])
+    inc('esco_contract_end_date_changes_total',
+        direction='increase' if parse_date(end_date) > contract.period.endDate else 'decrease')
+    observe('esco_contract_end_date_change_seconds', default_timer() - start)
+    request.validated['data']['milestones'] = target_milestones
+
+
+def get_milestones_dates_and_statuses(contract, src_milestones, end_date, state):
+    """
+    Milestones data with endDates and statuses updated for contract period
+    endDate change, see update_milestones_dates_and_statuses.
+
+    :param contract: contract model, it is not changed
+    :param src_milestones: contract milestones plain data, it is not changed
+    :param end_date: new contract period endDate isoformat
+    :param state: ContractState of the contract
+    :return: milestones data
+    :rtype: list
+    """
+    new_contract_end_date = parse_date(end_date)
+    milestones = contract.milestones  # real milestones
+    terminated = set(m.id for m in state.terminated_milestones)
+    # milestones period and status are changed only, so other subtrees are shared with src_milestones
+    target_milestones = []
+    for milestone in src_milestones:
+        milestone = dict(milestone)
+        if 'period' in milestone:
+            milestone['period'] = dict(milestone['period'])
+        target_milestones.append(milestone)
     for number, m in enumerate(milestones):
-        if m.status in ['met', 'notMet', 'partiallyMet']:
+        if m.id in terminated:
             continue
         # stretch milestone period endDate
         if m.period.startDate <= contract.period.endDate <= m.period.endDate:
@@ -222,11 +852,11 @@ def update_milestones_dates_and_statuses(request):
                     milestones[number+1].period.startDate.isoformat()
             else:
                 delta = timedelta(days=DAYS_PER_YEAR*15)
-                delta = update_delta(delta, contract)
+                delta = accelerate_delta(delta, state.accelerator)
                 target_milestones[number]['period']['endDate'] = (contract.period.startDate + delta).isoformat()
         # shrink milestone period endDate
         if target_milestones[number]['period']['startDate']\
-                <= request.validated['data']['period']['endDate'] <=\
+                <= end_date <=\
                 target_milestones[number]['period']['endDate']:
             target_milestones[number]['period']['endDate'] = new_contract_end_date
         #  increase endDate, need open (spare-> scheduled) new milestones
@@ -242,21 +872,53 @@ def update_milestones_dates_and_statuses(request):
                 if m.period.startDate <= new_contract_end_date:
                     if m.status != 'pending':
                         target_milestones[number]['status'] = 'scheduled'
+    return target_milestones
 
-    request.validated['data']['milestones'] = target_milestones
 
+MILESTONES_PREVIEW_CACHE = LRUCache(MILESTONES_PREVIEW_CACHE_SIZE)
 
-def update_delta(delta, contract):
+
+def preview_milestones_dates_and_statuses(request, end_date):
     """
-    Update delta, we need this function for testing. To shrink dates.
+    Milestones statuses and periods after contract period endDate change to
+    end_date, without changing the contract. Previews are cached by
+    contract revision and end_date.
 
-    :param delta
-    :param contract
-    :return: delta
-    :rtype: timedelta
+    :param request
+    :param end_date: proposed contract period endDate isoformat
+    :return: list of milestones id, sequenceNumber, status and period
+    :rtype: list
     """
-    if 'procurementMethodDetails' in contract and contract.procurementMethodDetails:
-            re_obj = ACCELERATOR_RE.search(contract.procurementMethodDetails)
-            if re_obj and 'accelerator' in re_obj.groupdict():
-                return timedelta(seconds=delta.total_seconds() / int(re_obj.groupdict()['accelerator']))
+    contract = request.validated['contract']
+    key = (contract.id, contract.rev, end_date)
+    preview = MILESTONES_PREVIEW_CACHE.get(key)
+    if preview is None:
+        src_milestones = [milestone.to_primitive() for milestone in contract.milestones]
+        preview = [{
+            'id': milestone['id'],
+            'sequenceNumber': milestone['sequenceNumber'],
+            'status': milestone['status'],
+            'period': dict(
+                (k, v.isoformat() if isinstance(v, datetime) else v)
+                for k, v in milestone['period'].items()
+            ),
+        } for milestone in get_milestones_dates_and_statuses(
+            contract, src_milestones, end_date, get_contract_state(request)
+        )]
+        MILESTONES_PREVIEW_CACHE.put(key, preview)
+    return preview
+
+
+def accelerate_delta(delta, accelerator):
+    if accelerator:
+        return timedelta(seconds=delta.total_seconds() / accelerator)
     return delta
+
+
+def get_accelerator(procurement_method_details):
+    """ Accelerator from procurementMethodDetails, 0 if contract isn't accelerated """
+    if procurement_method_details:
+        re_obj = ACCELERATOR_RE.search(procurement_method_details)
+        if re_obj and 'accelerator' in re_obj.groupdict():
+            return int(re_obj.groupdict()['accelerator'])
+    return 0
@@ -1,15 +1,21 @@
 # -*- coding: utf-8 -*-
 from datetime import timedelta
+from decimal import Decimal, InvalidOperation
 from iso8601 import parse_date
+from schematics.exceptions import ConversionError
 from openprocurement.api.utils import (
     get_now,
+    error_handler,
     raise_operation_error,
     update_logging_context,
 )
 from openprocurement.api.validation import validate_data
+from openprocurement.contracting.core.models import IsoDateTimeType
 from openprocurement.contracting.esco.models import Milestone
-from openprocurement.contracting.esco.constants import DAYS_PER_YEAR
-from openprocurement.contracting.esco.utils import update_delta
+from openprocurement.contracting.esco.constants import DAYS_PER_YEAR, NPV_GRID_MAX_SIZE, TERMINATED_STATUSES
+from openprocurement.contracting.esco.utils import (
+    accelerate_delta, get_contract_state, get_milestones_version, etag_version,
+)
 
 
 # milestones
@@ -17,73 +23,165 @@ def validate_patch_milestone_data(request):
     return validate_data(request, Milestone, True)
 
 
-def validate_milestones_sum_amount_paid(request):
-    amountPaid = request.validated['data'].get('amountPaid', {}).get('amount', 0)
-    contract = request.context.__parent__
-    milestones_amountPaids = [milestone.amountPaid.amount for milestone in contract.milestones]
-    if not sum(milestones_amountPaids) + amountPaid <= contract.value.amount:
-        raise_operation_error(
-            request, u"The sum of milestones amountPaid.amount can't be greater than contract.value.amount"
-        )
+def validate_milestone_if_match(request):
+    """ Optimistic concurrency of milestone update: If-Match has to match milestone version """
+    _validate_if_match(request, get_milestones_version(request, request.context))
 
-def validate_milestone_status_change(request):
-    milestone = request.context
+
+def validate_milestones_if_match(request):
+    """ Optimistic concurrency of bulk milestones update: If-Match has to match milestones listing version """
+    _validate_if_match(request, get_milestones_version(request))
+
+
+def _validate_if_match(request, version):
+    # ETags of any representation (opt_fields) match, if their version matches
+    if_match = request.if_match
+    if version not in if_match and version not in [etag_version(etag) for etag in getattr(if_match, 'etags', [])]:
+        request.errors.add('header', 'If-Match', "Precondition Failed")
+        request.errors.status = 412
+        raise error_handler(request.errors)
+
+
+def validate_terminate_contract_amount_paid(request):
     data = request.validated['data']
-    # can't update status from scheduled and to scheduled and to spare:)
+    contract = request.context
+    if data['status'] != 'active' and contract['value']['amount'] != contract['amountPaid']['amount'] and \
+            not data['terminationDetails']:
+        raise_operation_error(request, "terminationDetails is required.")
+
+
+# milestone patch rules are called as rule(milestone, data, contract, state) returning error message
+def _milestone_in_terminated_status(milestone, data, contract, state):
+    return "Can't update milestone in current ({}) status".format(milestone.status)
+
+
+def _pending_milestone_period(milestone, data, contract, state):
+    if milestone.period.startDate > get_now():
+        return "Can't update milestone before period.startDate"
+
+
+def _milestone_status_change(milestone, data, contract, state):
     if milestone.status != data['status'] and (milestone.status == 'scheduled' or
                                                data['status'] == 'scheduled' or
                                                data['status'] == 'spare'):
-        raise_operation_error(request, "Can't update milestone to {} status".format(data['status']))
+        return "Can't update milestone to {} status".format(data['status'])
 
 
-def validate_update_milestone_in_terminated_status(request):
-    milestone = request.context
-    if milestone.status in ['met', 'notMet', 'partiallyMet', 'spare']:
-        raise_operation_error(request, "Can't update milestone in current ({}) status".format(milestone.status))
+def _scheduled_milestone_without_pending_change(milestone, data, contract, state):
+    if not state.pending_change:
+        return "Can't update milestone in scheduled status without pending change"
 
 
-def validate_update_milestone_in_scheduled_status(request):
-    milestone = request.context
-    changes = milestone.__parent__.changes
-    pending_change = True if len(changes) > 0 and changes[-1].status == 'pending' else False
-    if not pending_change and milestone.status == 'scheduled':
-        raise_operation_error(request, "Can't update milestone in scheduled status without pending change")
+def _milestone_value_without_pending_change(milestone, data, contract, state):
+    if not state.pending_change:
+        value = data['value']
+        for k in value.keys():
+            if getattr(milestone.value, k) != value[k]:
+                return "Contract doesn't have any change in 'pending' status."
 
 
-def validate_update_milestone_value(request):
-    milestone = request.context
-    changes = milestone.__parent__.changes
-    pending_change = True if len(changes) > 0 and changes[-1].status == 'pending' else False
-    if not pending_change and milestone.status in ['pending', 'scheduled']:
-        value = request.validated['data']['value']
-        for k in value.keys():
-            v = getattr(milestone.value, k)
-            if v != value[k]:
-                raise_operation_error(request, "Contract doesn't have any change in 'pending' status.")
+def _scheduled_milestone_amountPaid(milestone, data, contract, state):
+    amountPaid = data['amountPaid']
+    for k in amountPaid.keys():
+        if getattr(milestone.amountPaid, k) != amountPaid[k]:
+            return "Can't update 'amountPaid' for scheduled milestone"
 
 
-def validate_update_milestone_amountPaid(request):
-    milestone = request.context
-    if milestone.status == 'scheduled':
-        amountPaid = request.validated['data']['amountPaid']
-        for k in amountPaid.keys():
-            v = getattr(milestone.amountPaid, k)
-            if v != amountPaid[k]:
-                raise_operation_error(request, "Can't update 'amountPaid' for scheduled milestone")
+def _milestones_sum_amount_paid(milestone, data, contract, state):
+    amountPaid = data.get('amountPaid', {}).get('amount', 0)
+    if not contract.get_milestones_totals().amountPaid + amountPaid <= contract.value.amount:
+        return u"The sum of milestones amountPaid.amount can't be greater than contract.value.amount"
 
 
-def validate_pending_milestone_update_period(request):
-    milestone = request.context
-    if milestone.status == 'pending' and milestone.period.startDate > get_now():
-        raise_operation_error(request, "Can't update milestone before period.startDate")
+# (rule, milestone statuses it's applied to), None means all statuses
+MILESTONE_PATCH_RULES = (
+    (_milestone_in_terminated_status, TERMINATED_STATUSES + ('spare',)),
+    (_pending_milestone_period, ('pending',)),
+    (_milestone_status_change, None),
+    (_scheduled_milestone_without_pending_change, ('scheduled',)),
+    (_milestone_value_without_pending_change, ('pending', 'scheduled')),
+    (_scheduled_milestone_amountPaid, ('scheduled',)),
+    (_milestones_sum_amount_paid, None),
+)
 
 
-def validate_terminate_contract_amount_paid(request):
+def compile_milestone_patch_plan(rules):
+    """ Rules applied to milestone in each status, in rules order """
+    statuses = Milestone._fields['status'].choices
+    return dict(
+        (status, tuple(rule for rule, rule_statuses in rules
+                       if rule_statuses is None or status in rule_statuses))
+        for status in statuses
+    )
+
+
+MILESTONE_PATCH_PLAN = compile_milestone_patch_plan(MILESTONE_PATCH_RULES)
+
+
+def validate_milestone_patch(request):
+    """
+    Validate milestone patch in one pass with rules compiled for current
+    milestone status. It gives the same errors in the same order as the
+    chain of milestone validators it replaces (see benchmarks.baseline).
+    """
+    milestone = request.context
     data = request.validated['data']
-    contract = request.context
-    if data['status'] != 'active' and contract['value']['amount'] != contract['amountPaid']['amount'] and \
-            not data['terminationDetails']:
-        raise_operation_error(request, "terminationDetails is required.")
+    contract = milestone.__parent__
+    state = get_contract_state(request)
+    for rule in MILESTONE_PATCH_PLAN[milestone.status]:
+        message = rule(milestone, data, contract, state)
+        if message:
+            raise_operation_error(request, message)
+
+
+def validate_patch_milestones_data(request):
+    """
+    Validate bulk milestones patch data: {"data": [{"id": ..., ...}, ...]}.
+    Milestones with their patch data are put into
+    request.validated['milestones_data'] in sequenceNumber order.
+    """
+    try:
+        json = request.json_body
+    except ValueError as e:
+        request.errors.add('body', 'data', e.message)
+        request.errors.status = 422
+        raise error_handler(request.errors)
+    data = json.get('data') if isinstance(json, dict) else None
+    if not isinstance(data, list) or not data or not all(isinstance(i, dict) for i in data):
+        request.errors.add('body', 'data', "Data not available")
+        request.errors.status = 422
+        raise error_handler(request.errors)
+    milestones_index = request.validated['contract'].get_items_index('milestones')
+    milestones_data = {}
+    for item in data:
+        milestone = milestones_index.get(item.get('id'))
+        if milestone is None:
+            request.errors.add('body', 'data', "Milestone {} not found".format(item.get('id')))
+        elif milestone.id in milestones_data:
+            request.errors.add('body', 'data', "Milestone {} is updated more than once".format(milestone.id))
+        else:
+            milestones_data[milestone.id] = (milestone, dict((k, v) for k, v in item.items() if k != 'id'))
+    if request.errors:
+        request.errors.status = 422
+        raise error_handler(request.errors)
+    request.validated['milestones_data'] = sorted(milestones_data.values(), key=lambda i: i[0].sequenceNumber)
+
+
+def validate_milestone_patch_item(request, milestone, data):
+    """
+    Validate one item of bulk milestones patch with the same validators as
+    milestone PATCH. Validated data is put into request.validated['data'].
+    """
+    # contract may be changed by previously applied items
+    get_contract_state(request, reset=True)
+    context = request.context
+    milestone.__parent__ = request.validated['contract']
+    request.context = milestone
+    try:
+        validate_data(request, Milestone, True, data=data)
+        validate_milestone_patch(request)
+    finally:
+        request.context = context
 
 
 # milestone documents
@@ -99,10 +197,10 @@ def validate_terminated_milestone_document_operation(request):
     else:
         data = request.context
     if "relatedItem" in data and data.get('documentOf') == 'milestone':
-        for m in request.validated['contract'].milestones:
-            if m.id == data['relatedItem'] and m.status in ['met', 'notMet', 'partiallyMet', 'spare']:
-                raise_operation_error(request, "Can't {} document in current ({}) milestone status".format(
-                    'update' if request.method == 'PUT' else 'add', m.status))
+        m = request.validated['contract'].get_items_index('milestones').get(data['relatedItem'])
+        if m is not None and m.status in TERMINATED_STATUSES + ('spare',):
+            raise_operation_error(request, "Can't {} document in current ({}) milestone status".format(
+                'update' if request.method == 'PUT' else 'add', m.status))
 
 
 def validate_scheduled_milestone_document_operation(request):
@@ -116,16 +214,12 @@ def validate_scheduled_milestone_document_operation(request):
             data['documentOf'] = request.context['documentOf']
     else:
         data = request.context
-    # in case of POST context is contract, so changes are in request.context
-    # in case of PATCH or PUT context is document, so changes are in request.context.__parent__
-    changes = request.context.changes if hasattr(request.context, 'changes') else \
-        request.context.__parent__.changes
-    pending_change = True if len(changes) > 0 and changes[-1].status == 'pending' else False
+    pending_change = get_contract_state(request).pending_change
     if "relatedItem" in data and data.get('documentOf') == 'milestone':
-        for m in request.validated['contract'].milestones:
-            if m.id == data['relatedItem'] and m.status == 'scheduled' and not pending_change:
-                raise_operation_error(request, "Can't {} document to scheduled milestone without pending change".format(
-                    'update' if request.method == 'PUT' else 'add'))
+        m = request.validated['contract'].get_items_index('milestones').get(data['relatedItem'])
+        if m is not None and m.status == 'scheduled' and not pending_change:
+            raise_operation_error(request, "Can't {} document to scheduled milestone without pending change".format(
+                'update' if request.method == 'PUT' else 'add'))
 
 
 def validate_update_contract_end_date(request):
@@ -145,32 +239,93 @@ def validate_update_contract_end_date(request):
     if 'period' in request.validated['data']:
         contract_period_end_date = parse_date(request.validated['data']['period']['endDate'])
         if request.context.period.endDate != contract_period_end_date:
-            contract = request.context
+            if not get_contract_state(request).pending_change:
+                raise_operation_error(request, "Can't update endDate of contract without pending change")
+            validate_contract_end_date_milestones(request, contract_period_end_date)
 
-            changes = contract.changes
-            pending_change = True if len(changes) > 0 and changes[-1].status == 'pending' else False
 
-            if not pending_change:
-                raise_operation_error(request, "Can't update endDate of contract without pending change")
+def validate_contract_end_date_milestones(request, contract_period_end_date):
+    """ contract.period.endDate checks against milestones, see validate_update_contract_end_date """
+    contract = request.validated['contract']
+    state = get_contract_state(request)
+
+    pending_milestones = state.pending_milestones
+    if len(pending_milestones) != 1:
+        raise_operation_error(request, "Can't update contract endDate, "
+                                       "all milestones are in terminated statuses")
 
-            pending_milestones = [x for x in contract.milestones if
-                                  x.status == 'pending']
-            if len(pending_milestones) != 1:
-                raise_operation_error(request, "Can't update contract endDate, "
-                                               "all milestones are in terminated statuses")
+    if contract_period_end_date < pending_milestones[0].period.startDate:
+        raise_operation_error(request, "Can't update contract endDate, if "
+                             "it is less than pending milestone startDate")
 
-            if contract_period_end_date < pending_milestones[0].period.startDate:
-                raise_operation_error(request, "Can't update contract endDate, if "
-                                     "it is less than pending milestone startDate")
+    delta = accelerate_delta(timedelta(days=DAYS_PER_YEAR * 15), state.accelerator)
+    contract_max_end_date = contract.period.startDate + delta
+    if contract_period_end_date > contract_max_end_date:
+        raise_operation_error(request, "Contract period cannot be over 15 years")
 
-            delta = timedelta(days=DAYS_PER_YEAR * 15)
-            delta = update_delta(delta, contract)
-            contract_max_end_date = contract.period.startDate + delta
-            if contract_period_end_date > contract_max_end_date:
-                raise_operation_error(request, "Contract period cannot be over 15 years")
+
+def validate_milestones_preview(request):
+    """
+    Validate proposed contract.period.endDate of milestones preview, passed
+    as endDate query parameter. It is checked against milestones same way
+    as on contract update, but pending change isn't required, so schedule
+    can be previewed before the change is created. Proposed endDate
+    isoformat is put into request.validated['end_date'].
+    """
+    value = request.params.get('endDate')
+    if not value:
+        request.errors.add('querystring', 'endDate', "This field is required.")
+        request.errors.status = 422
+        raise error_handler(request.errors)
+    try:
+        end_date = IsoDateTimeType().to_native(value)
+    except ConversionError as e:
+        request.errors.add('querystring', 'endDate', e.messages)
+        request.errors.status = 422
+        raise error_handler(request.errors)
+    validate_contract_end_date_milestones(request, end_date)
+    request.validated['end_date'] = end_date.isoformat()
 
 
 def validate_update_contract_start_date(request):
     if 'period' in request.validated['data'] and \
             request.validated['data']['period']['startDate'] != request.context.period.startDate.isoformat():
         raise_operation_error(request, "Can't change startDate of contract")
+
+
+def validate_npv_sensitivity(request):
+    """
+    Validate NPV sensitivity grid query: comma separated NBUdiscountRate
+    values and contractDuration values as years:days. Contract values are
+    used for missed parameters. Grid is put into
+    request.validated['discount_rates'] and request.validated['durations'].
+    """
+    contract = request.validated['contract']
+    discount_rates = []
+    for value in filter(None, request.params.get('NBUdiscountRate', '').split(',')):
+        try:
+            discount_rate = Decimal(value)
+        except InvalidOperation:
+            discount_rate = None
+        if discount_rate is None or not discount_rate.is_finite() or \
+                not Decimal('0') <= discount_rate <= Decimal('0.99'):
+            request.errors.add('querystring', 'NBUdiscountRate', u"Value should be number from 0 to 0.99")
+            break
+        discount_rates.append(discount_rate)
+    durations = []
+    for value in filter(None, request.params.get('contractDuration', '').split(',')):
+        years, _, days = value.partition(':')
+        if not years.isdigit() or not (days or '0').isdigit() or \
+                int(years) > 15 or int(days or 0) >= DAYS_PER_YEAR or (int(years) == 15 and int(days or 0)):
+            request.errors.add('querystring', 'contractDuration',
+                               u"Value should be years:days, not longer than 15 years")
+            break
+        durations.append((int(years), int(days or 0)))
+    if not request.errors and len(discount_rates or [1]) * len(durations or [1]) > NPV_GRID_MAX_SIZE:
+        request.errors.add('querystring', 'data', u"Grid can't have more than {} points".format(NPV_GRID_MAX_SIZE))
+    if request.errors:
+        request.errors.status = 422
+        raise error_handler(request.errors)
+    request.validated['discount_rates'] = discount_rates or [contract.NBUdiscountRate]
+    request.validated['durations'] = durations or [
+        (contract.value.contractDuration.years, contract.value.contractDuration.days)]
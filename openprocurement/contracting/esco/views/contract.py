@@ -22,7 +22,14 @@ from openprocurement.contracting.esco.validation import (
     validate_update_contract_end_date
 )
 
-from openprocurement.contracting.esco.utils import update_milestones_dates_and_statuses
+from openprocurement.contracting.esco.metrics import count_transitions, timed, timed_validators, timings_params
+from openprocurement.contracting.esco.utils import (
+    update_milestones_dates_and_statuses,
+    serialize_projection,
+    get_opt_fields,
+    prefer_minimal,
+    minimal_representation,
+)
 
 
 @contractingresource(name='esco:Contract',
@@ -32,12 +39,25 @@ from openprocurement.contracting.esco.utils import update_milestones_dates_and_s
 class ContractResource(BaseContractResource):
     """ ESCO Contract Resource """
 
+    @json_view(permission='view_contract')
+    def get(self):
+        """ESCO Contract Read
+
+        Contract fields can be restricted with opt_fields query parameter:
+
+            GET /contracts/{contract_id}?opt_fields=status,amountPaid
+
+        """
+        with timed(self.request, 'serialize'):
+            data = serialize_projection(self.request.validated['contract'], 'view', get_opt_fields(self.request))
+        return {'data': data}
+
     @json_view(content_type="application/json", permission='edit_contract',
-               validators=(validate_patch_contract_data,
-                           validate_contract_update_not_in_allowed_status,
-                           validate_terminate_contract_amount_paid,
-                           validate_update_contract_start_date,
-                           validate_update_contract_end_date))
+               validators=timed_validators(validate_patch_contract_data,
+                                           validate_contract_update_not_in_allowed_status,
+                                           validate_terminate_contract_amount_paid,
+                                           validate_update_contract_start_date,
+                                           validate_update_contract_end_date))
     def patch(self):
         """Esco Contract Edit (partial)
 
@@ -343,15 +363,29 @@ class ContractResource(BaseContractResource):
             }
 
         """
-        if 'period' in self.request.validated['data'] and \
-                self.context.period.endDate.isoformat() != self.request.validated['data']['period']['endDate']:
-            update_milestones_dates_and_statuses(self.request)
+        milestones_updated = 'period' in self.request.validated['data'] and \
+            self.context.period.endDate.isoformat() != self.request.validated['data']['period']['endDate']
+        if milestones_updated:
+            with timed(self.request, 'update_milestones'):
+                update_milestones_dates_and_statuses(self.request)
         contract = self.request.validated['contract']
-        apply_patch(self.request, save=False, src=self.request.validated['contract_src'])
+        with timed(self.request, 'apply_patch'):
+            apply_patch(self.request, save=False, src=self.request.validated['contract_src'])
+            if milestones_updated:
+                contract.recalculate_milestones_totals()
 
         # validate_terminate_contract_without_amountPaid(self.request)
 
-        if save_contract(self.request):
+        with timed(self.request, 'save'):
+            saved = save_contract(self.request)
+        if saved:
+            count_transitions(self.request)
+            with timed(self.request, 'serialize'):
+                if prefer_minimal(self.request):
+                    data = minimal_representation(contract)
+                else:
+                    data = serialize_projection(contract, 'view', get_opt_fields(self.request))
             self.LOGGER.info('Updated contract {}'.format(contract.id),
-                             extra=context_unpack(self.request, {'MESSAGE_ID': 'contract_patch'}))
-            return {'data': contract.serialize('view')}
+                             extra=context_unpack(self.request, {'MESSAGE_ID': 'contract_patch'},
+                                                  timings_params(self.request)))
+            return {'data': data}
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from decimal import Decimal
+
+from openprocurement.api.utils import json_view, APIResource
+from openprocurement.contracting.esco.design import (
+    milestones_by_dateModified_view,
+    milestones_real_by_dateModified_view,
+    milestones_test_by_dateModified_view,
+)
+from openprocurement.contracting.esco.utils import milestoneresource
+
+FEED_LIMIT = 100
+FEED_MAX_LIMIT = 1000
+# offset of the next page is "<dateModified>|<contract id>|<sequenceNumber>"
+OFFSET_SEPARATOR = '|'
+# feed views by mode parameter, milestones of test contracts are hidden by default as in contracts feed
+VIEW_MAP = {
+    u'': milestones_real_by_dateModified_view,
+    u'test': milestones_test_by_dateModified_view,
+    u'_all_': milestones_by_dateModified_view,
+}
+
+
+def to_amount(value):
+    return Decimal(str(value)) if value is not None else None
+
+
+def parse_offset(offset):
+    """
+    Feed view startkey for offset. Plain dateModified offset starts feed
+    from milestones modified at that time (inclusive), next page offset
+    continues strictly after the last milestone key of previous page, even
+    if that milestone was modified since ({} is collated after numbers).
+    """
+    if not offset:
+        return None
+    parts = offset.split(OFFSET_SEPARATOR)
+    if len(parts) == 3 and parts[2].isdigit():
+        return [parts[0], parts[1], int(parts[2]), {}]
+    return [offset]
+
+
+@milestoneresource(name='esco:Milestones Feed',
+                   path='/esco/milestones',
+                   description="ESCO contracts milestones changes feed")
+class MilestonesFeedResource(APIResource):
+
+    @json_view(permission='view_listing')
+    def get(self):
+        """Milestones changes feed
+
+        Milestones of all ESCO contracts in order of their dateModified, for
+        incremental sync. Each item is compact: milestone id, contract id,
+        sequenceNumber, status, dateModified, value and amountPaid amounts.
+
+        Example request:
+
+            GET /esco/milestones?offset=2018-05-01T00:00:00+03:00&limit=100
+
+        Milestones of test contracts are listed with mode=test, of all
+        contracts with mode=_all_. Page is continued by next_page offset.
+        """
+        params = {}
+        limit = self.request.params.get('limit', '')
+        if limit:
+            params['limit'] = limit
+        limit = int(limit) if limit.isdigit() and FEED_MAX_LIMIT >= int(limit) > 0 else FEED_LIMIT
+        mode = self.request.params.get('mode', '')
+        if mode and mode in VIEW_MAP:
+            params['mode'] = mode
+        view = VIEW_MAP.get(mode, milestones_real_by_dateModified_view)
+        offset = self.request.params.get('offset', '')
+        startkey = parse_offset(offset)
+        options = {'limit': limit}
+        if startkey:
+            options['startkey'] = startkey
+        rows = view(self.db, **options)
+        data = []
+        for row in rows:
+            date_modified, contract_id, sequence_number = row.key
+            data.append({
+                'id': row.value['id'],
+                'contract_id': contract_id,
+                'sequenceNumber': sequence_number,
+                'status': row.value['status'],
+                'dateModified': date_modified,
+                'value': to_amount(row.value['value']),
+                'amountPaid': to_amount(row.value['amountPaid']),
+            })
+        if data:
+            last = data[-1]
+            params['offset'] = OFFSET_SEPARATOR.join(
+                [last['dateModified'], last['contract_id'], str(last['sequenceNumber'])])
+        elif offset:
+            params['offset'] = offset
+        route_name = self.request.matched_route.name
+        return {
+            'data': data,
+            'next_page': {
+                'offset': params.get('offset', ''),
+                'path': self.request.route_path(route_name, _query=params),
+                'uri': self.request.route_url(route_name, _query=params),
+            }
+        }
@@ -1,23 +1,37 @@
 # -*- coding: utf-8 -*-
+from operator import attrgetter
+
 from openprocurement.api.utils import (
     get_now,
     json_view,
     context_unpack,
+    apply_data_patch,
     APIResource,
 )
-from openprocurement.contracting.core.utils import apply_patch
+from openprocurement.contracting.esco.constants import TERMINATED_STATUSES
+from openprocurement.contracting.esco.metrics import (
+    add_transition, count_transitions, timed, timed_validators, timings_params,
+)
 from openprocurement.contracting.esco.utils import (
     milestoneresource,
+    serialize_items,
+    serialize_projection,
+    get_opt_fields,
+    prefer_minimal,
+    minimal_representation,
+    get_milestones_etag,
+    check_not_modified,
+    save_contract_snapshot,
+    preview_milestones_dates_and_statuses,
 )
 from openprocurement.contracting.esco.validation import (
+    validate_milestone_patch,
     validate_patch_milestone_data,
-    validate_update_milestone_value,
-    validate_milestone_status_change,
-    validate_milestones_sum_amount_paid,
-    validate_update_milestone_amountPaid,
-    validate_pending_milestone_update_period,
-    validate_update_milestone_in_scheduled_status,
-    validate_update_milestone_in_terminated_status,
+    validate_milestone_patch_item,
+    validate_patch_milestones_data,
+    validate_milestones_preview,
+    validate_milestone_if_match,
+    validate_milestones_if_match,
 )
 
 
@@ -39,8 +53,45 @@ class ContractMilestoneResource(APIResource):
         # TODO: add example later no model yet exist
 
         """
+        check_not_modified(self.request, get_milestones_etag(self.request))
         contract = self.request.validated['contract']
-        return {'data': [i.serialize(i.status) for i in contract.milestones if i.serialize(i.status)]}
+        with timed(self.request, 'serialize'):
+            data = list(serialize_items(contract.milestones, attrgetter('status'), get_opt_fields(self.request)))
+        return {'data': data}
+
+    @json_view(content_type="application/json", permission='edit_contract',
+               validators=timed_validators(validate_milestones_if_match, validate_patch_milestones_data))
+    def collection_patch(self):
+        """Update of several milestones at once
+
+        Request data is a list of milestones patches with milestone ids.
+        Patches are validated and applied in milestones sequenceNumber
+        order, as if they were sent one by one, and saved in one revision.
+        If any of them is invalid, no milestone is updated.
+
+        """
+        milestones_data = self.request.validated['milestones_data']
+        patched = False
+        for milestone, data in milestones_data:
+            with timed(self.request, 'validator:validate_milestone_patch_item'):
+                validate_milestone_patch_item(self.request, milestone, data)
+            with timed(self.request, 'apply_patch'):
+                patched = self.apply_milestone_patch(milestone, self.request.validated['data']) or patched
+        if not patched:
+            return
+        with timed(self.request, 'save'):
+            saved = save_contract_snapshot(self.request)
+        if saved:
+            count_transitions(self.request)
+            self.request.response.etag = get_milestones_etag(self.request)
+            with timed(self.request, 'serialize'):
+                data = self.serialize_updated([m for m, _ in milestones_data])
+            self.LOGGER.info(
+                'Updated contract milestones {}'.format(', '.join([m.id for m, _ in milestones_data])),
+                extra=context_unpack(self.request, {'MESSAGE_ID': 'contract_milestones_patch'},
+                                     timings_params(self.request))
+            )
+            return {'data': data}
 
     @json_view(permission='view_contract')
     def get(self):
@@ -53,16 +104,16 @@ class ContractMilestoneResource(APIResource):
 
 
         """
-        return {'data': self.request.context.serialize(self.request.context.status)}
+        check_not_modified(self.request, get_milestones_etag(self.request, self.request.context))
+        with timed(self.request, 'serialize'):
+            data = serialize_projection(self.request.context, self.request.context.status,
+                                        get_opt_fields(self.request))
+        return {'data': data}
 
     @json_view(
         content_type="application/json", permission='edit_contract',
-        validators=(
-            validate_patch_milestone_data, validate_update_milestone_in_terminated_status,
-            validate_pending_milestone_update_period, validate_milestone_status_change,
-            validate_update_milestone_in_scheduled_status, validate_update_milestone_value,
-            validate_update_milestone_amountPaid, validate_milestones_sum_amount_paid,
-        )
+        validators=timed_validators(validate_milestone_if_match, validate_patch_milestone_data,
+                                    validate_milestone_patch)
     )
     def patch(self):
         """Update of milestone
@@ -71,20 +122,79 @@ class ContractMilestoneResource(APIResource):
         # TODO: add example later no model yet exist
 
         """
-        contract = self.request.context.__parent__
-        milestone = self.request.context
+        with timed(self.request, 'apply_patch'):
+            patched = self.apply_milestone_patch(self.request.context, self.request.validated['data'])
+        if not patched:
+            return
+        with timed(self.request, 'save'):
+            saved = save_contract_snapshot(self.request)
+        if saved:
+            count_transitions(self.request)
+            self.request.response.etag = get_milestones_etag(self.request, self.request.context)
+            with timed(self.request, 'serialize'):
+                data = self.serialize_updated([self.request.context])[0]
+            self.LOGGER.info(
+                'Updated contract milestone {}'.format(self.request.context.id),
+                extra=context_unpack(self.request, {'MESSAGE_ID': 'contract_milestone_patch'},
+                                     timings_params(self.request))
+            )
+            return {'data': data}
+
+    def serialize_updated(self, milestones):
+        """ Serialize updated milestones for response, honoring Prefer: return=minimal and opt_fields """
+        if prefer_minimal(self.request):
+            return [minimal_representation(m) for m in milestones]
+        fields = get_opt_fields(self.request)
+        return [serialize_projection(m, m.status, fields) for m in milestones]
+
+    def apply_milestone_patch(self, milestone, data):
+        """
+        Apply validated patch data to milestone, open next milestone if this
+        one is terminated and update contract milestones totals.
+
+        :return: True if milestone is changed
+        """
+        contract = milestone.__parent__
+        snapshot = self.request.validated['contract_snapshot']
+        snapshot.touch_milestones(milestone)
         date_modified = get_now()
         milestone.dateModified = date_modified
-        if self.request.validated['data']['status'] in ['met', 'notMet', 'partiallyMet'] and \
-                self.request.context.sequenceNumber < 16:
+        if data['status'] != milestone.status:
+            add_transition(self.request, milestone.status, data['status'])
+        if data['status'] in TERMINATED_STATUSES and milestone.sequenceNumber < 16:
             milestone.date = date_modified
-            next_milestone = contract.milestones[self.request.context.sequenceNumber]
+            next_milestone = contract.milestones[milestone.sequenceNumber]
             if next_milestone.status != u"spare":
+                snapshot.touch_milestones(next_milestone)
+                add_transition(self.request, next_milestone.status, u"pending")
                 next_milestone.status = u"pending"
                 next_milestone.dateModified = next_milestone.date = date_modified
-        if apply_patch(self.request, src=self.request.context.serialize()):
-            self.LOGGER.info(
-                'Updated contract milestone {}'.format(self.request.context.id),
-                extra=context_unpack(self.request, {'MESSAGE_ID': 'contract_milestone_patch'})
-            )
-            return {'data': self.request.context.serialize(self.request.context.status)}
+        contract.update_milestones_totals(milestone.get_totals_contribution(),
+                                          milestone.get_totals_contribution(data))
+        patch = apply_data_patch(milestone.serialize(), data)
+        if patch:
+            milestone.import_data(patch)
+        return bool(patch)
+
+
+@milestoneresource(name='esco:Contract Milestones Preview',
+                   path='/contracts/{contract_id}/milestones_preview',
+                   contractType="esco",
+                   description="Contract milestones after contract endDate change")
+class ContractMilestonesPreviewResource(APIResource):
+
+    @json_view(permission='view_contract', validators=timed_validators(validate_milestones_preview))
+    def get(self):
+        """Milestones schedule preview
+
+        Milestones statuses and periods, if contract period endDate is
+        changed to endDate query parameter. Contract is not changed.
+
+        Example request:
+
+            GET /contracts/{contract_id}/milestones_preview?endDate=2020-01-01T00:00:00+02:00
+
+        """
+        with timed(self.request, 'update_milestones'):
+            data = preview_milestones_dates_and_statuses(self.request, self.request.validated['end_date'])
+        return {'data': data}
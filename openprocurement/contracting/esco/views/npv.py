@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from openprocurement.api.utils import json_view, APIResource
+from openprocurement.contracting.esco.metrics import timed, timed_validators
+from openprocurement.contracting.esco.utils import milestoneresource, npv_grid
+from openprocurement.contracting.esco.validation import validate_npv_sensitivity
+
+
+@milestoneresource(name='esco:Contract NPV Sensitivity',
+                   path='/contracts/{contract_id}/npv_sensitivity',
+                   contractType="esco",
+                   description="Contract amountPerformance over grid of discount rates and durations")
+class ContractNPVSensitivityResource(APIResource):
+
+    @json_view(permission='view_contract', validators=timed_validators(validate_npv_sensitivity))
+    def get(self):
+        """amountPerformance sensitivity
+
+        amountPerformance of the contract for every combination of
+        NBUdiscountRate values and contractDuration (years:days) values.
+        Contract values are used for missed parameters.
+
+        Example request:
+
+            GET /contracts/{contract_id}/npv_sensitivity?NBUdiscountRate=0.1,0.125,0.15&contractDuration=5:0,10:180
+
+        """
+        with timed(self.request, 'npv_grid'):
+            data = npv_grid(self.request.validated['contract'],
+                            self.request.validated['discount_rates'],
+                            self.request.validated['durations'])
+        return {'data': data}
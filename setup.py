@@ -19,6 +19,11 @@ docs_requires = requires + [
 entry_points = {
     'openprocurement.contracting.core.plugins': [
         'contract.esco = openprocurement.contracting.esco.includeme:includeme'
+    ],
+    'console_scripts': [
+        'esco_portfolio = openprocurement.contracting.esco.portfolio:main',
+        'esco_recalculate_npv = openprocurement.contracting.esco.npv_recalculation:main',
+        'esco_check_milestones_totals = openprocurement.contracting.esco.milestones_totals:main',
     ]
 }
 